@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import chess
+
+
+# Поля ограничения поиска, по которым результат анализа детерминирован
+CACHEABLE_LIMITS = ("depth", "nodes", "mate")
+
+
+def normalize_fen(fen):
+    # Нормализованный FEN: без счетчиков ходов и с взятием на проходе только если оно возможно
+    return chess.Board(fen).epd()
+
+
+def limit_key(limit):
+    # Строка ограничения поиска, например "depth=15"; None, если поиск зависит от времени
+    if limit.time is not None or limit.white_clock is not None or limit.black_clock is not None:
+        return None
+    parts = [f"{name}={getattr(limit, name)}" for name in CACHEABLE_LIMITS if getattr(limit, name) is not None]
+    return ",".join(parts) if parts else None
+
+
+# Двухуровневый кэш анализа двигателя: LRU/LFU в памяти перед хранилищем SQLite на диске
+class AnalysisCache:
+    def __init__(self, path="analysis.db", memory_size=10000, disk_size=1000000, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.policy = policy
+        self.memory = OrderedDict()  # Ключ -> [запись, число обращений]
+        # Для LFU: число обращений -> ключи с таким числом (от давних к недавним) и наименьшее число обращений,
+        # поэтому вытесняемая запись находится без просмотра всей памяти
+        self.buckets = {}
+        self.min_hits = 0
+        self.lock = threading.Lock()
+        self.writes = 0  # Число записей на диск (размер хранилища проверяем не на каждой)
+
+        # Статистика попаданий
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            "key TEXT PRIMARY KEY, move TEXT, cp INTEGER, mate INTEGER, pv TEXT, "
+            "hits INTEGER DEFAULT 0, last_used REAL)"
+        )
+        self.connection.commit()
+
+    def _key(self, fen, limit):
+        search = limit_key(limit)
+        if search is None:
+            return None
+        return f"{normalize_fen(fen)}|{search}"
+
+    def get(self, fen, limit):
+        # Поиск анализа позиции: сначала в памяти, затем на диске
+        key = self._key(fen, limit)
+        if key is None:
+            return None
+
+        with self.lock:
+            if key in self.memory:
+                self.memory_hits += 1
+                hits = self.memory[key][1]
+                self.memory[key][1] = hits + 1
+                self.memory.move_to_end(key)
+                if self.policy == "lfu":
+                    self._link(key, hits + 1)
+                    self._unlink(key, hits)
+                return self.memory[key][0]
+
+            row = self.connection.execute(
+                "SELECT move, cp, mate, pv, hits FROM analysis WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self.connection.execute(
+                "UPDATE analysis SET hits = hits + 1, last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.connection.commit()
+            entry = {"move": row[0], "cp": row[1], "mate": row[2], "pv": json.loads(row[3])}
+            self._remember(key, entry, row[4] + 1)
+            return entry
+
+    def put(self, fen, limit, move, info):
+        # Сохранение результата поиска: лучший ход, оценка и главный вариант
+        key = self._key(fen, limit)
+        score = info.get("score")
+        if key is None or move is None or score is None:
+            return  # Анализ без оценки не сохраняем
+
+        score = score.relative
+        entry = {
+            "move": move.uci(),
+            "cp": score.score(),
+            "mate": score.mate(),
+            "pv": [m.uci() for m in info.get("pv", [move])],
+        }
+
+        with self.lock:
+            self._remember(key, entry, 1)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO analysis (key, move, cp, mate, pv, hits, last_used) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                (key, entry["move"], entry["cp"], entry["mate"], json.dumps(entry["pv"]), time.time()),
+            )
+            self.writes += 1
+            if self.writes % 1000 == 0:
+                self._evict_disk()
+            self.connection.commit()
+
+    def _remember(self, key, entry, hits):
+        # Добавление записи в память с вытеснением по выбранной политике
+        if key in self.memory:
+            if self.policy == "lfu":
+                self._unlink(key, self.memory[key][1])
+        else:
+            while self.memory and len(self.memory) >= self.memory_size:
+                if self.policy == "lru":
+                    self.memory.popitem(last=False)
+                else:
+                    # Самая давняя из записей с наименьшим числом обращений
+                    victim = next(iter(self.buckets[self.min_hits]))
+                    self._unlink(victim, self.min_hits)
+                    del self.memory[victim]
+        self.memory[key] = [entry, hits]
+        self.memory.move_to_end(key)
+        if self.policy == "lfu":
+            self._link(key, hits)
+
+    def _link(self, key, hits):
+        self.buckets.setdefault(hits, OrderedDict())[key] = None
+        if not self.min_hits or hits < self.min_hits:
+            self.min_hits = hits
+
+    def _unlink(self, key, hits):
+        bucket = self.buckets[hits]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[hits]
+            if hits == self.min_hits:
+                # Опустела корзина минимума: ищем среди корзин (их столько, сколько разных чисел обращений)
+                self.min_hits = min(self.buckets, default=0)
+
+    def _evict_disk(self):
+        # Если на диске слишком много записей, удаляем десятую часть самых невостребованных
+        count = self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        if count <= self.disk_size:
+            return
+        order = "last_used" if self.policy == "lru" else "hits, last_used"
+        self.connection.execute(
+            f"DELETE FROM analysis WHERE key IN (SELECT key FROM analysis ORDER BY {order} LIMIT ?)",
+            (count - self.disk_size + self.disk_size // 10,),
+        )
+
+    def hit_rate(self):
+        # Доля запросов, обслуженных кэшем
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self):
+        # Статистика кэша
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "memory_entries": len(self.memory),
+        }
+
+    def clear(self):
+        # Полная очистка кэша
+        with self.lock:
+            self.memory.clear()
+            self.buckets.clear()
+            self.min_hits = 0
+            self.connection.execute("DELETE FROM analysis")
+            self.connection.commit()
+
+    def close(self):
+        # Закрываем хранилище на диске
+        self.connection.close()
@@ -0,0 +1,130 @@
+import configparser
+import getpass
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Журнал попыток решения задачек с отложенной записью: record() только кладет попытку в буфер в памяти,
+# фоновый поток раз в flush_interval секунд (или когда буфер заполнился) пишет все попытки одним INSERT
+# в puzzle_attempts и увеличивает NbPlays одним UPDATE на пачку задачек. Если база недоступна,
+# попытки остаются в буфере до следующей записи, а при закрытии сохраняются в файл и дописываются при следующем запуске
+# (файл удаляется, только когда эти попытки записаны в базу)
+
+ATTEMPT_COLUMNS = ("PuzzleId", "User", "Solved", "Mistakes", "Seconds", "CreatedAt")
+PENDING_FILE = "attempts.pending.json"
+
+
+class AttemptLog:
+    def __init__(self, config_file="config.ini", user=None, flush_interval=5.0, max_pending=500, pending_file=PENDING_FILE):
+        self.config_file = config_file
+        self.user = user or getpass.getuser()
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending_file = pending_file
+        self.connection = None  # Соединение открывает поток записи при первой пачке
+        self.lock = threading.Lock()
+        self.attempts = self._load_pending()  # Попытки, еще не записанные в базу
+        self.replaying = bool(self.attempts)  # Файл pending_file удаляется после первой успешной записи
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, puzzle_id, solved, mistakes=0, seconds=None):
+        # Попытка решения: в базу попадет при следующей записи
+        attempt = (puzzle_id, self.user, bool(solved), mistakes, seconds, time.strftime("%Y-%m-%d %H:%M:%S"))
+        with self.lock:
+            self.attempts.append(attempt)
+            full = len(self.attempts) >= self.max_pending
+        if full:
+            self.wake.set()
+
+    def _run(self):
+        while not self.stopping:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as error:
+                print(f"Attempt log: write failed, will retry ({error})")
+                self._disconnect()
+
+    def _connect(self):
+        if self.connection is None:
+            import mysql.connector
+
+            config = configparser.ConfigParser()
+            config.read(self.config_file)
+            self.connection = mysql.connector.connect(
+                host=config["mysql"]["host"],
+                user=config["mysql"]["user"],
+                password=config["mysql"]["password"],
+                database=config["mysql"]["database"]
+            )
+        return self.connection
+
+    def _disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def flush(self):
+        # Запись буфера: попытки и счетчики NbPlays в одной транзакции; при ошибке попытки возвращаются в буфер
+        with self.lock:
+            attempts, self.attempts = self.attempts, []
+        if not attempts:
+            return
+        try:
+            connection = self._connect()
+            cursor = connection.cursor()
+            placeholders = ", ".join(["%s"] * len(ATTEMPT_COLUMNS))
+            cursor.executemany(
+                f"INSERT INTO puzzle_attempts ({', '.join(ATTEMPT_COLUMNS)}) VALUES ({placeholders})", attempts
+            )
+
+            # Одна задачка могла встретиться в пачке несколько раз: складываем, горячие строки puzzles обновляются по разу
+            plays = Counter(attempt[0] for attempt in attempts)
+            cases = " ".join(["WHEN %s THEN %s"] * len(plays))
+            cursor.execute(
+                f"UPDATE puzzles SET NbPlays = NbPlays + CASE PuzzleId {cases} END "
+                f"WHERE PuzzleId IN ({', '.join(['%s'] * len(plays))})",
+                [value for item in plays.items() for value in item] + list(plays)
+            )
+            connection.commit()
+            cursor.close()
+        except Exception:
+            with self.lock:
+                self.attempts[:0] = attempts
+            raise
+        if self.replaying:
+            # Попытки из файла в первой пачке и уже в базе
+            os.remove(self.pending_file)
+            self.replaying = False
+
+    def _load_pending(self):
+        # Попытки, не записанные при прошлом закрытии
+        if not os.path.exists(self.pending_file):
+            return []
+        with open(self.pending_file) as file:
+            return [tuple(attempt) for attempt in json.load(file)]
+
+    def close(self):
+        # Последняя запись; если база недоступна, попытки сохраняются в pending_file
+        self.stopping = True
+        self.wake.set()
+        self.thread.join()
+        try:
+            self.flush()
+        except Exception as error:
+            print(f"Attempt log: {len(self.attempts)} attempts saved to {self.pending_file} ({error})")
+            # Атомарная запись: прерывание не оставит половину файла
+            temporary = self.pending_file + ".tmp"
+            with open(temporary, "w") as file:
+                json.dump(self.attempts, file)
+            os.replace(temporary, self.pending_file)
+        self._disconnect()
@@ -0,0 +1,192 @@
+import configparser
+import csv
+import json
+import sys
+
+import numpy as np
+
+# Корпус задачек в структурированном массиве NumPy: вся метаинформация читается с диска через mmap,
+# фильтры и статистика считаются векторно, без запросов к MySQL.
+# Темы хранятся битовыми масками (до 64 * THEME_WORDS тем), словарь тем лежит рядом в JSON
+
+THEME_WORDS = 2
+PUZZLE_DTYPE = np.dtype([
+    ("id", "S20"),
+    ("rating", "<i2"),
+    ("rating_deviation", "<i2"),
+    ("popularity", "<i2"),
+    ("nb_plays", "<i4"),
+    ("themes", "<u8", (THEME_WORDS,)),
+])
+CHUNK_SIZE = 100000
+
+
+def _themes_path(path):
+    return path[:-4] + ".themes.json" if path.endswith(".npy") else path + ".themes.json"
+
+
+class PuzzleCorpus:
+    def __init__(self, puzzles, themes):
+        self.puzzles = puzzles  # Структурированный массив PUZZLE_DTYPE (обычно np.memmap)
+        self.themes = themes  # Список тем: номер бита -> название
+
+    def __len__(self):
+        return len(self.puzzles)
+
+    @classmethod
+    def load(cls, path):
+        # Массив отображается в память: строки читаются с диска только при обращении
+        puzzles = np.load(path, mmap_mode="r")
+        with open(_themes_path(path)) as file:
+            themes = json.load(file)
+        return cls(puzzles, themes)
+
+    @classmethod
+    def build(cls, rows, path):
+        # Сборка корпуса из потока строк (PuzzleId, Rating, RatingDeviation, Popularity, NbPlays, Themes)
+        themes = {}
+        chunks = []
+        chunk = np.zeros(CHUNK_SIZE, dtype=PUZZLE_DTYPE)
+        size = 0
+        for puzzle_id, rating, deviation, popularity, nb_plays, puzzle_themes in rows:
+            record = chunk[size]
+            record["id"] = puzzle_id.encode()
+            record["rating"] = int(rating)
+            record["rating_deviation"] = int(deviation)
+            record["popularity"] = int(popularity)
+            record["nb_plays"] = int(nb_plays)
+            for theme in (puzzle_themes or "").split():
+                bit = themes.setdefault(theme, len(themes))
+                if bit >= 64 * THEME_WORDS:
+                    raise ValueError(f"Too many themes (more than {64 * THEME_WORDS})")
+                record["themes"][bit // 64] |= np.uint64(1 << (bit % 64))
+            size += 1
+            if size == CHUNK_SIZE:
+                chunks.append(chunk)
+                chunk = np.zeros(CHUNK_SIZE, dtype=PUZZLE_DTYPE)
+                size = 0
+        chunks.append(chunk[:size])
+
+        np.save(path, np.concatenate(chunks))
+        names = sorted(themes, key=themes.get)
+        with open(_themes_path(path), "w") as file:
+            json.dump(names, file)
+        return cls.load(path)
+
+    @classmethod
+    def build_from_csv(cls, csv_path, path):
+        # Из выгрузки Lichess: PuzzleId,FEN,Moves,Rating,RatingDeviation,Popularity,NbPlays,Themes,GameUrl,OpeningTags
+        with open(csv_path, newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # Заголовок
+            return cls.build(((row[0], row[3], row[4], row[5], row[6], row[7]) for row in reader), path)
+
+    @classmethod
+    def build_from_mysql(cls, path, config_file="config.ini"):
+        # Из таблицы puzzles: строки читаются потоком, пачками
+        import mysql.connector
+
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        connection = mysql.connector.connect(
+            host=config["mysql"]["host"],
+            user=config["mysql"]["user"],
+            password=config["mysql"]["password"],
+            database=config["mysql"]["database"]
+        )
+        cursor = connection.cursor()
+        cursor.execute("SELECT PuzzleId, Rating, RatingDeviation, Popularity, NbPlays, Themes FROM puzzles")
+
+        def rows():
+            while True:
+                batch = cursor.fetchmany(10000)
+                if not batch:
+                    return
+                yield from batch
+
+        try:
+            return cls.build(rows(), path)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def theme_mask(self, themes):
+        # Битовая маска для списка тем
+        mask = np.zeros(THEME_WORDS, dtype=np.uint64)
+        for theme in themes:
+            if theme not in self.themes:
+                raise KeyError(f"Unknown theme: {theme}")
+            bit = self.themes.index(theme)
+            mask[bit // 64] |= np.uint64(1 << (bit % 64))
+        return mask
+
+    def filter(self, min_rating=None, max_rating=None, themes=None, any_themes=None, min_popularity=None):
+        # Булева маска задачек: рейтинг, все темы из themes, хотя бы одна из any_themes, популярность
+        puzzles = self.puzzles
+        selected = np.ones(len(puzzles), dtype=bool)
+        if min_rating is not None:
+            selected &= puzzles["rating"] >= min_rating
+        if max_rating is not None:
+            selected &= puzzles["rating"] <= max_rating
+        if min_popularity is not None:
+            selected &= puzzles["popularity"] >= min_popularity
+        if themes:
+            mask = self.theme_mask(themes)
+            selected &= ((puzzles["themes"] & mask) == mask).all(axis=1)
+        if any_themes:
+            mask = self.theme_mask(any_themes)
+            selected &= ((puzzles["themes"] & mask) != 0).any(axis=1)
+        return selected
+
+    def rating_histogram(self, bins=30, selected=None):
+        ratings = self.puzzles["rating"] if selected is None else self.puzzles["rating"][selected]
+        return np.histogram(ratings, bins=bins)
+
+    def theme_frequencies(self, selected=None):
+        # Сколько задачек с каждой темой: распаковываем биты всех масок разом
+        masks = self.puzzles["themes"] if selected is None else self.puzzles["themes"][selected]
+        bits = np.unpackbits(np.ascontiguousarray(masks).view(np.uint8).reshape(len(masks), -1), axis=1, bitorder="little")
+        counts = bits.sum(axis=0, dtype=np.int64)
+        return {theme: int(counts[bit]) for bit, theme in enumerate(self.themes)}
+
+    def sample(self, n, selected=None, seed=None):
+        # Случайные задачки с вероятностью, пропорциональной популярности (-100..100 сдвигается в 1..201)
+        indices = np.arange(len(self.puzzles)) if selected is None else np.flatnonzero(selected)
+        if not len(indices) or n <= 0:
+            return np.zeros(0, dtype=np.int64)  # Под фильтр не попала ни одна задачка
+        weights = self.puzzles["popularity"][indices].astype(np.float64) + 101
+        generator = np.random.default_rng(seed)
+        return generator.choice(indices, size=min(n, len(indices)), replace=False, p=weights / weights.sum())
+
+    def ids(self, indices):
+        return [puzzle_id.decode() for puzzle_id in self.puzzles["id"][indices]]
+
+
+def main():
+    args = sys.argv
+    if len(args) < 3 or args[1] not in ("build", "stats"):
+        print("Usage: python corpus.py build <puzzles.csv | mysql> <puzzles.npy>")
+        print("       python corpus.py stats <puzzles.npy>")
+        sys.exit(1)
+
+    if args[1] == "build":
+        if len(args) < 4:
+            print("Error: Output path is required.")
+            sys.exit(1)
+        if args[2] == "mysql":
+            corpus = PuzzleCorpus.build_from_mysql(args[3])
+        else:
+            corpus = PuzzleCorpus.build_from_csv(args[2], args[3])
+        print(f"{len(corpus)} puzzles, {len(corpus.themes)} themes")
+    else:
+        corpus = PuzzleCorpus.load(args[2])
+        counts, edges = corpus.rating_histogram(bins=range(400, 3400, 200))
+        for count, edge in zip(counts, edges):
+            print(f"{int(edge):>5}: {count}")
+        frequencies = corpus.theme_frequencies()
+        for theme in sorted(frequencies, key=frequencies.get, reverse=True)[:20]:
+            print(f"{theme}: {frequencies[theme]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,79 @@
 import asyncio
 import websockets
 
-from flask import Flask, render_template
-from chess import Game
+from flask import Flask, Response, abort, jsonify, render_template, request
+from engine import EnginePool
+from puzzles import PuzzleStore, public_puzzle
+from render import BoardRenderer
+from protocol import encode, decode, legal_targets, state_message, move_message
+from sessions import SessionManager, TooManySessions
+from validation import MoveValidator
 import threading
 
 app = Flask(__name__)
+engines = EnginePool()  # Двигатели работают в цикле событий веб-сокетов
+sessions = SessionManager()  # Партии и задачки всех клиентов
+renderer = BoardRenderer()  # Картинки досок для ссылок и превью
+puzzle_store = PuzzleStore()  # Задачки для JSON API
+validator = MoveValidator()  # Проверка ходов без состояния
 
 async def server(websocket, path=None):
+    # Соединение клиента: сессия создается по первому сообщению или находится по id при переподключении
+    session = None
+
+    async def send_move(move):
+        await websocket.send(encode(move_message(session.board, move, session.status())))
+
+    async def opponent_moves():
+        # Ответ соперника: ход из задачки или ход компьютера
+        move = session.reply()
+        if move:
+            await send_move(move)
+        if session.wants_computer_move():
+            move = await engines.get_best_move(session.board.fen())
+            # Пока двигатель думал, позицию мог изменить другой клиент этой сессии
+            if move in session.board.legal_moves:
+                session.board.push(move)
+                await send_move(move)
+
+    async def send_state():
+        await websocket.send(encode(state_message(session.board, session.color, session.status())))
+
     try:
-        game = Game()
-        while True:
-            frame = game.render_frame()
-            await websocket.send(frame.read())
+        async for data in websocket:
+            try:
+                message = decode(data)
+                kind = message["type"]
+                if session is None:
+                    session = sessions.open(message.get("session") if kind == "hello" else None)
+                    await websocket.send(encode({"type": "session", "id": session.id}))
+                sessions.touch(session)
+
+                if kind == "hello":
+                    await send_state()
+                elif kind == "new":
+                    session.reset(message.get("fen"), message.get("color", "white"), message.get("opponent", "man"), message.get("moves"))
+                    await send_state()
+                    await opponent_moves()
+                elif kind == "select":
+                    square = message["square"]
+                    await websocket.send(encode({"type": "moves", "square": square, "moves": legal_targets(session.board, square)}))
+                elif kind == "move":
+                    await send_move(session.push(message["uci"]))
+                    await opponent_moves()
+                else:
+                    raise ValueError(f"Unknown message type: {kind}")
+            except (ValueError, KeyError, TooManySessions) as error:
+                await websocket.send(encode({"type": "error", "message": str(error)}))
     except websockets.exceptions.ConnectionClosed:
         print("Client disconnected")
+    finally:
+        if session:
+            sessions.release(session)
 
 async def start_server():
+    await engines.start()
+    sessions.start_eviction()
     return await websockets.serve(server, "localhost", 8765)
 
 @app.route('/')
@@ -31,6 +88,81 @@ def game():
 def puzzles():
     return render_template('puzzles.html')
 
+@app.route('/board.<fmt>')
+def board_image(fmt):
+    # Картинка доски: /board.png?fen=...&flip=1&size=480&highlight=e2,e4
+    highlights = [square for square in request.args.get('highlight', '').split(',') if square]
+    try:
+        etag, data = renderer.render(
+            request.args.get('fen', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR'),
+            flipped=request.args.get('flip') == '1',
+            highlights=highlights,
+            size=request.args.get('size', 480, type=int),
+            fmt=fmt,
+        )
+    except ValueError:
+        abort(400)
+    response = Response(data, mimetype=f'image/{fmt}')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    # Если у клиента уже есть эта картинка (If-None-Match), отвечаем 304 без тела
+    return response.make_conditional(request)
+
+@app.route('/api/validate', methods=['POST'])
+def validate_move():
+    # Проверка хода: {"fen": "..." или "position": "<хеш>", "move": "e2e4"}
+    data = request.get_json(silent=True) or {}
+    try:
+        result = validator.validate(str(data['move']), data.get('fen'), data.get('position'))
+    except KeyError:
+        abort(404 if 'move' in data else 400)  # Неизвестный хеш позиции или нет хода
+    except ValueError:
+        abort(400)
+    response = jsonify(result)
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/api/puzzles/next')
+def next_puzzle():
+    # Случайная задачка: /api/puzzles/next?min_rating=1200&max_rating=1600&theme=fork
+    puzzle = puzzle_store.next(
+        request.args.get('min_rating', 0, type=int),
+        request.args.get('max_rating', 4000, type=int),
+        request.args.get('theme'),
+    )
+    if puzzle is None:
+        abort(404)
+    response = jsonify(public_puzzle(puzzle))
+    response.cache_control.no_store = True  # Каждый раз новая задачка
+    return response
+
+@app.route('/api/puzzles/<puzzle_id>')
+def get_puzzle(puzzle_id):
+    puzzle = puzzle_store.get(puzzle_id)
+    if puzzle is None:
+        abort(404)
+    response = jsonify(public_puzzle(puzzle))
+    # Задачка по id почти не меняется: пусть браузеры и прокси отвечают сами
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/puzzles/<puzzle_id>/validate', methods=['POST'])
+def validate_puzzle_move(puzzle_id):
+    # Проверка хода: {"ply": 1, "move": "e2e4"}
+    data = request.get_json(silent=True) or {}
+    try:
+        result = puzzle_store.validate(puzzle_id, int(data['ply']), str(data['move']))
+    except (KeyError, ValueError):
+        abort(400)
+    if result is None:
+        abort(404)
+    response = jsonify(result)
+    response.cache_control.no_store = True
+    return response
+
 def run_websocket():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -41,8 +173,10 @@ def start_flask():
     app.run(debug=True, use_reloader=False)
 
 if __name__ == '__main__':
+    # Режим разработки: Flask и отдельный сервер веб-сокетов (в продакшене - asgi.py)
+    app.config['WS_URL'] = 'ws://localhost:8765'
     websocket_thread = threading.Thread(target=run_websocket)
     websocket_thread.daemon = True
     websocket_thread.start()
 
-app.run(debug=True)
\ No newline at end of file
+    start_flask()
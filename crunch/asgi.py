@@ -0,0 +1,66 @@
+import websockets
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, engines, sessions, server
+
+# ASGI-режим: страницы, API задачек и веб-сокет партии на одном порту и в одном цикле событий.
+# Запуск: uvicorn asgi:application --workers 4
+# Каждый рабочий процесс держит свои сессии и пул двигателей
+
+http = WsgiToAsgi(app)  # Маршруты Flask (блокирующие обработчики идут в пул потоков asgiref)
+
+
+# Веб-сокет ASGI с тем же интерфейсом, что у соединения websockets, чтобы обработчик server был общим
+class AsgiWebSocket:
+    def __init__(self, receive, send):
+        self.receive = receive
+        self._send = send
+        self.closed = False
+
+    async def send(self, data):
+        if self.closed:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        await self._send({"type": "websocket.send", "text": data})
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            event = await self.receive()
+            if event["type"] == "websocket.receive":
+                return event.get("text") or (event.get("bytes") or b"").decode()  # Сервер может прислать "bytes": None
+            if event["type"] == "websocket.disconnect":
+                self.closed = True
+                raise StopAsyncIteration
+
+
+async def lifespan(receive, send):
+    # Двигатели и очистка сессий запускаются вместе с сервером
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            await engines.start()
+            sessions.start_eviction()
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            sessions.eviction_task.cancel()
+            await engines.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http":
+        await http(scope, receive, send)
+    elif scope["type"] == "websocket":
+        if scope["path"] != "/ws":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        event = await receive()  # websocket.connect
+        if event["type"] != "websocket.connect":
+            return
+        await send({"type": "websocket.accept"})
+        await server(AsgiWebSocket(receive, send))
+    elif scope["type"] == "lifespan":
+        await lifespan(receive, send)
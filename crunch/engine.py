@@ -0,0 +1,88 @@
+import asyncio
+import contextlib
+
+import chess
+import chess.engine
+
+# Путь к двигателю Stockfish и число процессов двигателя на сервер
+ENGINE = "./stockfish-ubuntu-x86-64-avx2"
+ENGINE_WORKERS = 2
+
+
+# Асинхронный двигатель: работает прямо в цикле событий сервера, без отдельного потока
+class AsyncEngine:
+    def __init__(self, path, depth=15):
+        self.path = path
+        self.depth = depth
+        self.transport = None
+        self.engine = None
+
+    async def start(self):
+        # Запуск процесса двигателя
+        self.transport, self.engine = await chess.engine.popen_uci(self.path)
+        return self
+
+    async def get_best_move(self, fen, limit=None):
+        # Лучший ход в позиции (по умолчанию поиск на фиксированную глубину)
+        board = chess.Board(fen)
+        result = await self.engine.play(board, limit or chess.engine.Limit(depth=self.depth))
+        return result.move
+
+    async def stream_lines(self, fen, multipv=3, depth=None):
+        # Потоковый анализ с N лучшими вариантами (асинхронный генератор).
+        # Поиск останавливается при закрытии генератора (удобно через contextlib.aclosing)
+        board = chess.Board(fen)
+        lines = {}
+        with await self.engine.analysis(board, chess.engine.Limit(depth=depth or self.depth), multipv=multipv) as analysis:
+            async for info in analysis:
+                if "pv" not in info or "score" not in info:
+                    continue
+                score = info["score"].relative
+                lines[info.get("multipv", 1)] = {
+                    "move": info["pv"][0].uci(),
+                    "depth": info.get("depth"),
+                    "cp": score.score(),
+                    "mate": score.mate(),
+                    "pv": [move.uci() for move in info["pv"]],
+                }
+                yield [lines[i] for i in sorted(lines)]
+
+    async def close(self):
+        # Завершение процесса двигателя
+        if self.engine:
+            await self.engine.quit()
+            self.engine = None
+
+
+# Пул двигателей: один цикл событий обслуживает несколько процессов и много клиентов
+class EnginePool:
+    def __init__(self, path=ENGINE, size=ENGINE_WORKERS, depth=15):
+        self.path = path
+        self.size = size
+        self.depth = depth
+        self.engines = []
+        self.idle = asyncio.Queue()  # Свободные двигатели
+
+    async def start(self):
+        # Запускаем все процессы двигателя параллельно
+        self.engines = await asyncio.gather(*(AsyncEngine(self.path, self.depth).start() for _ in range(self.size)))
+        for engine in self.engines:
+            self.idle.put_nowait(engine)
+        return self
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        # Берем свободный двигатель; если все заняты, ждем без блокировки цикла событий
+        engine = await self.idle.get()
+        try:
+            yield engine
+        finally:
+            self.idle.put_nowait(engine)
+
+    async def get_best_move(self, fen, limit=None):
+        async with self.acquire() as engine:
+            return await engine.get_best_move(fen, limit)
+
+    async def close(self):
+        await asyncio.gather(*(engine.close() for engine in self.engines))
+        self.engines = []
@@ -0,0 +1,70 @@
+import json
+
+import chess
+
+
+# Протокол веб-сокета: сервер шлет короткие JSON-сообщения только при изменении партии.
+#
+# Клиент -> сервер:
+#   {"type": "hello", "session": "..."}                                   (первое сообщение; id - при переподключении)
+#   {"type": "new", "fen": "...", "opponent": "man" | "computer", "color": "white" | "black"}
+#   {"type": "new", "fen": "...", "moves": "e2e4 e7e5 ..."}               (задачка в формате Lichess)
+#   {"type": "select", "square": "e2"}
+#   {"type": "move", "uci": "e2e4"}
+#
+# Сервер -> клиент:
+#   {"type": "session", "id": "..."}                                    (id сессии для переподключения)
+#   {"type": "state", "fen": "...", "status": "...", "color": "white"}  (новая партия)
+#   {"type": "moves", "square": "e2", "moves": ["e3", "e4"]}             (ходы выбранной фигуры)
+#   {"type": "move", "uci": "e2e4", "fen": "...", "status": "..."}       (сделанный ход)
+#   {"type": "error", "message": "..."}
+
+
+def encode(message):
+    # Компактная сериализация без лишних пробелов
+    return json.dumps(message, separators=(",", ":"))
+
+
+def decode(data):
+    message = json.loads(data)
+    if not isinstance(message, dict) or "type" not in message:
+        raise ValueError("Message must be an object with a 'type' field")
+    return message
+
+
+def game_status(board):
+    # Состояние партии для клиента
+    if board.is_checkmate():
+        return "checkmate"
+    if board.is_stalemate():
+        return "stalemate"
+    if board.is_insufficient_material() or board.can_claim_fifty_moves() or board.can_claim_threefold_repetition():
+        return "draw"
+    if board.is_check():
+        return "check"
+    return "playing"
+
+
+def legal_targets(board, square):
+    # Клетки, куда может пойти фигура с клетки square
+    origin = chess.parse_square(square)
+    return sorted({chess.square_name(move.to_square) for move in board.legal_moves if move.from_square == origin})
+
+
+def parse_move(board, uci):
+    # Ход клиента в UCI; превращение пешки без указания фигуры считаем превращением в ферзя
+    move = chess.Move.from_uci(uci)
+    if move not in board.legal_moves and move.promotion is None:
+        move = chess.Move(move.from_square, move.to_square, promotion=chess.QUEEN)
+    if move not in board.legal_moves:
+        raise ValueError(f"Illegal move: {uci}")
+    return move
+
+
+def state_message(board, color="white", status=None):
+    return {"type": "state", "fen": board.fen(), "status": status or game_status(board), "color": color}
+
+
+def move_message(board, move, status=None):
+    # board - позиция уже после хода move
+    return {"type": "move", "uci": move.uci(), "fen": board.fen(), "status": status or game_status(board)}
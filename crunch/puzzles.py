@@ -0,0 +1,118 @@
+import configparser
+import random
+import threading
+from collections import OrderedDict
+
+import chess
+import mysql.connector.pooling
+
+# Столбцы таблицы puzzles (см. guide.md)
+COLUMNS = ("PuzzleId", "FEN", "Moves", "Rating", "RatingDeviation", "Popularity", "NbPlays", "Themes", "GameUrl", "OpeningTags")
+
+
+# Хранилище задачек: пул соединений MySQL и LRU-кэш популярных задачек в памяти процесса
+class PuzzleStore:
+    def __init__(self, config_file="config.ini", pool_size=5, cache_size=2048):
+        self.config_file = config_file
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self.pool = None  # Пул создается при первом запросе
+        self.cache = OrderedDict()  # PuzzleId -> задачка
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        with self.lock:
+            if self.pool is None:
+                config = configparser.ConfigParser()
+                config.read(self.config_file)
+                self.pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name="puzzles",
+                    pool_size=self.pool_size,
+                    host=config["mysql"]["host"],
+                    user=config["mysql"]["user"],
+                    password=config["mysql"]["password"],
+                    database=config["mysql"]["database"],
+                )
+        return self.pool.get_connection()
+
+    def _fetch_one(self, query, params):
+        connection = self._connect()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            cursor.close()
+            return row
+        finally:
+            connection.close()  # Соединение возвращается в пул
+
+    def _remember(self, puzzle):
+        with self.lock:
+            self.cache[puzzle["PuzzleId"]] = puzzle
+            self.cache.move_to_end(puzzle["PuzzleId"])
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return puzzle
+
+    def get(self, puzzle_id):
+        # Задачка по id: из кэша или из базы
+        with self.lock:
+            if puzzle_id in self.cache:
+                self.cache.move_to_end(puzzle_id)
+                return self.cache[puzzle_id]
+        puzzle = self._fetch_one(f"SELECT {', '.join(COLUMNS)} FROM puzzles WHERE PuzzleId = %s", (puzzle_id,))
+        return self._remember(puzzle) if puzzle else None
+
+    def next(self, min_rating=0, max_rating=4000, theme=None):
+        # Случайная задачка из диапазона рейтинга (и с темой): начинаем со случайного рейтинга,
+        # чтобы запрос шел по индексу idx_rating, а не через ORDER BY RAND()
+        query = f"SELECT {', '.join(COLUMNS)} FROM puzzles WHERE Rating BETWEEN %s AND %s"
+        params = [random.randint(min_rating, max_rating), max_rating]
+        if theme:
+            query += " AND Themes LIKE %s"
+            params.append(f"%{theme}%")
+        query += " ORDER BY Rating LIMIT 1"
+
+        puzzle = self._fetch_one(query, params)
+        if puzzle is None:  # Выше случайного рейтинга ничего нет - ищем с начала диапазона
+            params[0] = min_rating
+            puzzle = self._fetch_one(query, params)
+        return self._remember(puzzle) if puzzle else None
+
+    def validate(self, puzzle_id, ply, move):
+        # Проверка хода решающего: ply - номер хода в Moves (1, 3, 5...)
+        puzzle = self.get(puzzle_id)
+        if puzzle is None:
+            return None
+        moves = puzzle["Moves"].split()
+        if ply % 2 == 0 or ply >= len(moves):
+            raise ValueError(f"Invalid ply: {ply}")
+
+        board = chess.Board(puzzle["FEN"])
+        for expected in moves[:ply]:
+            board.push_uci(expected)
+        played = chess.Move.from_uci(move)
+        correct = move == moves[ply]
+        if not correct and played in board.legal_moves:
+            # Как на Lichess: любой мат засчитывается
+            board.push(played)
+            correct = board.is_checkmate()
+
+        solved = correct and (ply + 1 >= len(moves) or board.is_checkmate())
+        return {
+            "correct": correct,
+            "solved": solved,
+            "reply": moves[ply + 1] if correct and not solved else None,
+        }
+
+
+def public_puzzle(puzzle):
+    # Задачка для клиента без решения: только позиция и первый ход соперника
+    return {
+        "id": puzzle["PuzzleId"],
+        "fen": puzzle["FEN"],
+        "first_move": puzzle["Moves"].split()[0],
+        "length": len(puzzle["Moves"].split()),
+        "rating": puzzle["Rating"],
+        "themes": puzzle["Themes"].split() if puzzle["Themes"] else [],
+    }
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import chess
+from PIL import Image
+
+# Цвета клеток и подсветки (как в desktop.py)
+LIGHT = (222, 227, 230)
+DARK = (140, 162, 173)
+HIGHLIGHT = (50, 50, 50, 90)
+
+PIECES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pieces")
+FORMATS = {"png": "PNG", "webp": "WEBP"}
+
+
+# Отрисовка доски в PNG/WebP без pygame: собираем картинку из заранее масштабированных плиток
+class BoardRenderer:
+    def __init__(self, cache_size=1024):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (расстановка, переворот, подсветка, размер, формат) -> (etag, данные)
+        self.tiles = {}  # (символ фигуры, размер клетки) -> плитка
+        self.boards = {}  # размер клетки -> пустая доска
+        self.lock = threading.Lock()  # Flask обслуживает запросы в нескольких потоках
+        self.hits = 0
+        self.misses = 0
+
+    def _piece_tile(self, symbol, square_size):
+        # Картинка фигуры, масштабированная под размер клетки (загружается один раз)
+        key = (symbol, square_size)
+        if key not in self.tiles:
+            piece = chess.Piece.from_symbol(symbol)
+            color = "white" if piece.color == chess.WHITE else "black"
+            name = chess.piece_name(piece.piece_type)
+            image = Image.open(os.path.join(PIECES_DIR, color, f"{name}.png")).convert("RGBA")
+            self.tiles[key] = image.resize((square_size, square_size), Image.LANCZOS)
+        return self.tiles[key]
+
+    def _empty_board(self, square_size):
+        # Пустая доска (одинакова для обеих ориентаций: a1 всегда темная в левом нижнем углу)
+        if square_size not in self.boards:
+            image = Image.new("RGBA", (square_size * 8, square_size * 8), LIGHT)
+            dark = Image.new("RGBA", (square_size, square_size), DARK)
+            for row in range(8):
+                for col in range(8):
+                    if (row + col) % 2 == 1:
+                        image.paste(dark, (col * square_size, row * square_size))
+            self.boards[square_size] = image
+        return self.boards[square_size]
+
+    def _draw(self, board, flipped, highlights, square_size):
+        image = self._empty_board(square_size).copy()
+        overlay = Image.new("RGBA", (square_size, square_size), HIGHLIGHT)
+        for square in chess.SQUARES:
+            row, col = 7 - chess.square_rank(square), chess.square_file(square)
+            if flipped:
+                row, col = 7 - row, 7 - col
+            position = (col * square_size, row * square_size)
+            if square in highlights:
+                image.alpha_composite(overlay, position)
+            piece = board.piece_at(square)
+            if piece:
+                image.alpha_composite(self._piece_tile(piece.symbol(), square_size), position)
+        return image
+
+    def render(self, fen, flipped=False, highlights=(), size=480, fmt="png"):
+        # Картинка доски и ее ETag; одинаковые запросы обслуживаются из кэша
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if not fen or not fen.split():
+            raise ValueError("Empty FEN")
+        board = chess.BaseBoard(fen.split()[0])
+        squares = frozenset(chess.parse_square(square) for square in highlights)
+        square_size = max(8, min(size, 2048) // 8)
+
+        key = (board.board_fen(), bool(flipped), squares, square_size, fmt)
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+
+        # Рисуем без блокировки: одинаковую картинку два потока в худшем случае нарисуют дважды
+        buffer = io.BytesIO()
+        self._draw(board, flipped, squares, square_size).save(buffer, FORMATS[fmt])
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        result = (etag, buffer.getvalue())
+
+        with self.lock:
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
@@ -0,0 +1,134 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+
+import chess
+
+from protocol import game_status, parse_move
+
+
+# Партия или задачка одного клиента без графики: только доска и настройки
+class Session:
+    __slots__ = ("id", "board", "mode", "color", "opponent", "puzzle_moves", "step_index", "last_seen", "connections")
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.connections = 0  # Число открытых соединений (вкладок) этой сессии
+        self.last_seen = time.monotonic()
+        self.reset()
+
+    def reset(self, fen=None, color="white", opponent="man", puzzle_moves=None):
+        # Новая партия или задачка (в задачке первый ход делает соперник)
+        self.board = chess.Board(fen or chess.STARTING_FEN)
+        self.color = color
+        self.opponent = opponent
+        self.mode = "puzzle" if puzzle_moves else "normal"
+        self.puzzle_moves = puzzle_moves.split() if puzzle_moves else []
+        self.step_index = 0
+        if self.mode == "puzzle":
+            self.color = "black" if self.board.turn == chess.WHITE else "white"
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def is_player_turn(self):
+        return self.board.turn == (self.color == "white")
+
+    def status(self):
+        if self.mode == "puzzle" and self.step_index == len(self.puzzle_moves):
+            return "solved"
+        return game_status(self.board)
+
+    def push(self, uci):
+        # Проверка и выполнение хода клиента
+        if (self.mode == "puzzle" or self.opponent == "computer") and not self.is_player_turn():
+            raise ValueError("Not your turn")
+        move = parse_move(self.board, uci)
+        if self.mode == "puzzle":
+            if self.step_index >= len(self.puzzle_moves) or move.uci() != self.puzzle_moves[self.step_index]:
+                raise ValueError("Wrong move")
+            self.step_index += 1
+        self.board.push(move)
+        return move
+
+    def reply(self):
+        # Очередной ход соперника в задачке (или None)
+        if self.mode != "puzzle" or self.is_player_turn() or self.step_index >= len(self.puzzle_moves):
+            return None
+        move = chess.Move.from_uci(self.puzzle_moves[self.step_index])
+        self.step_index += 1
+        self.board.push(move)
+        return move
+
+    def wants_computer_move(self):
+        return self.mode == "normal" and self.opponent == "computer" and not self.is_player_turn() and not self.board.is_game_over()
+
+
+class TooManySessions(RuntimeError):
+    pass
+
+
+# Менеджер сессий: тысячи партий в одном процессе, переподключение и вытеснение простаивающих
+class SessionManager:
+    def __init__(self, idle_timeout=1800, max_sessions=10000):
+        self.idle_timeout = idle_timeout  # Секунды без активности до удаления сессии
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # От давно неактивных к недавно активным
+        self.eviction_task = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session:
+            self.touch(session)
+        return session
+
+    def touch(self, session):
+        # Активность сессии: переносим в конец, чтобы порядок словаря оставался порядком last_seen
+        session.touch()
+        self.sessions.move_to_end(session.id)
+
+    def open(self, session_id=None):
+        # Переподключение к существующей сессии или создание новой
+        session = self.get(session_id) if session_id else None
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                self.evict_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise TooManySessions("Too many sessions, try again later")
+            session = Session(secrets.token_urlsafe(12))
+            self.sessions[session.id] = session
+        session.connections += 1
+        return session
+
+    def release(self, session):
+        # Соединение закрыто; сессия живет до переподключения или вытеснения
+        session.connections -= 1
+        if session.id in self.sessions:
+            self.touch(session)
+
+    def evict_idle(self, now=None):
+        # Удаление сессий без соединений, простаивающих дольше idle_timeout
+        now = now or time.monotonic()
+        evicted = 0
+        for session_id in list(self.sessions):
+            session = self.sessions[session_id]
+            if now - session.last_seen < self.idle_timeout:
+                break  # Дальше только более свежие сессии
+            if session.connections == 0:
+                del self.sessions[session_id]
+                evicted += 1
+        return evicted
+
+    async def run_eviction(self, interval=60):
+        # Периодическая очистка в цикле событий сервера
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def start_eviction(self, interval=60):
+        self.eviction_task = asyncio.get_running_loop().create_task(self.run_eviction(interval))
+        return self.eviction_task
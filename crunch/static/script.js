@@ -1,19 +1,104 @@
-// Подключение к WebSocket-серверу
-const socket = new WebSocket('ws://localhost:8765');
+// Подключение к WebSocket-серверу: адрес задает сервер, иначе /ws на том же порту (режим ASGI)
+const socket = new WebSocket(document.body.dataset.wsUrl ||
+    (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
 
-// Когда WebSocket открыт, логируем подключение
+const PIECES = {
+    K: '♔', Q: '♕', R: '♖', B: '♗', N: '♘', P: '♙',
+    k: '♚', q: '♛', r: '♜', b: '♝', n: '♞', p: '♟'
+};
+const FILES = 'abcdefgh';
+
+// Состояние доски на клиенте: сервер присылает только изменения
+let fen = null;
+let color = 'white';
+let selected = null;
+let targets = [];
+
+// Разбор расстановки фигур из FEN: клетка ('e2') -> символ фигуры
+function parsePlacement(fen) {
+    const squares = {};
+    fen.split(' ')[0].split('/').forEach(function (line, row) {
+        let col = 0;
+        for (const character of line) {
+            if (/\d/.test(character)) {
+                col += parseInt(character);
+            } else {
+                squares[FILES[col] + (8 - row)] = character;
+                col += 1;
+            }
+        }
+    });
+    return squares;
+}
+
+// Отрисовка доски
+function render(status) {
+    const gameBoard = document.getElementById('game-board');
+    const squares = parsePlacement(fen);
+    gameBoard.innerHTML = '';
+    for (let i = 0; i < 64; i++) {
+        const row = color === 'white' ? Math.floor(i / 8) : 7 - Math.floor(i / 8);
+        const col = color === 'white' ? i % 8 : 7 - i % 8;
+        const square = FILES[col] + (8 - row);
+        const cell = document.createElement('div');
+        cell.className = 'square ' + ((row + col) % 2 === 0 ? 'light' : 'dark');
+        if (square === selected) cell.classList.add('selected');
+        if (targets.includes(square)) cell.classList.add('target');
+        cell.textContent = PIECES[squares[square]] || '';
+        cell.addEventListener('click', function () { handleClick(square); });
+        gameBoard.appendChild(cell);
+    }
+    if (status) document.getElementById('status').textContent = status;
+}
+
+// Клик по клетке: выбор фигуры или ход
+function handleClick(square) {
+    if (selected && targets.includes(square)) {
+        socket.send(JSON.stringify({ type: 'move', uci: selected + square }));
+        selected = null;
+        targets = [];
+    } else {
+        selected = square;
+        targets = [];
+        socket.send(JSON.stringify({ type: 'select', square: square }));
+    }
+    render();
+}
+
+// Когда WebSocket открыт, представляемся серверу (id сессии - для переподключения к своей партии)
 socket.addEventListener('open', function () {
     console.log('Connected to the WebSocket server');
+    socket.send(JSON.stringify({ type: 'hello', session: localStorage.getItem('session') }));
 });
 
-// Когда WebSocket получает сообщение (игровой кадр)
+// Сообщения сервера
 socket.addEventListener('message', function (event) {
-    const frame = event.data;
-    console.log('Received frame:', frame);
-
-    // Отображение игрового кадра или обновление доски
-    const gameBoard = document.getElementById('game-board');
-    gameBoard.textContent = frame; // Пример: отображение сырого кадра
+    const message = JSON.parse(event.data);
+    switch (message.type) {
+        case 'session':
+            localStorage.setItem('session', message.id);
+            break;
+        case 'state':
+            fen = message.fen;
+            color = message.color;
+            selected = null;
+            targets = [];
+            render(message.status);
+            break;
+        case 'moves':
+            if (message.square === selected) {
+                targets = message.moves;
+                render();
+            }
+            break;
+        case 'move':
+            fen = message.fen;
+            render(message.status);
+            break;
+        case 'error':
+            console.error('Server error:', message.message);
+            break;
+    }
 });
 
 // Обработка ошибок (например, если WebSocket неожиданно закроется)
@@ -26,7 +111,11 @@ socket.addEventListener('close', function () {
     console.log('WebSocket connection closed');
 });
 
-// Начало новой игры
-startGame.addEventListener('click', function() {
-    console.log('Starting new game...');
-});
\ No newline at end of file
+// Начало новой игры против компьютера
+const startGame = document.getElementById('startGame');
+if (startGame) {
+    startGame.addEventListener('click', function () {
+        console.log('Starting new game...');
+        socket.send(JSON.stringify({ type: 'new', opponent: 'computer', color: 'white' }));
+    });
+}
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import chess
+
+from protocol import game_status
+
+
+def position_key(board):
+    # Хеш полного FEN: у позиций с разными счетчиками ходов (правило 50 ходов) разные записи
+    return int.from_bytes(hashlib.blake2b(board.fen().encode(), digest_size=8).digest(), "big")
+
+
+# Проверка ходов без состояния: позиция задается FEN или хешем уже встречавшейся позиции.
+# Для недавних позиций хранятся доска, множество легальных ходов и уже проверенные ходы,
+# поэтому повторные проверки не разбирают FEN и не генерируют ходы заново
+class MoveValidator:
+    def __init__(self, cache_size=65536):
+        self.cache_size = cache_size
+        self.positions = OrderedDict()  # Хеш позиции -> (доска, легальные ходы в UCI, результаты проверок легальных ходов)
+        self.fens = OrderedDict()  # FEN -> хеш позиции
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, board):
+        entry = (board, frozenset(move.uci() for move in board.legal_moves), {})
+        self.positions[key] = entry
+        if len(self.positions) > self.cache_size:
+            self.positions.popitem(last=False)
+        return entry
+
+    def _lookup(self, fen=None, position=None):
+        # Позиция из кэша по хешу или по FEN
+        if position is not None:
+            key = int(position, 16)
+            if key in self.positions:
+                self.hits += 1
+                self.positions.move_to_end(key)
+                return key, self.positions[key]
+            if fen is None:
+                raise KeyError(f"Unknown position: {position}")
+
+        if fen is None:
+            raise ValueError("Either 'fen' or 'position' is required")
+        key = self.fens.get(fen)
+        if key is None:
+            board = chess.Board(fen)
+            key = position_key(board)
+            self.fens[fen] = key
+            if len(self.fens) > self.cache_size:
+                self.fens.popitem(last=False)
+        if key in self.positions:
+            self.hits += 1
+            self.positions.move_to_end(key)
+            return key, self.positions[key]
+        self.misses += 1
+        return key, self._remember(key, chess.Board(fen))
+
+    def validate(self, move, fen=None, position=None):
+        # Результат: легальность, позиция после хода (FEN и хеш) и состояние партии
+        with self.lock:
+            key, (board, legal, results) = self._lookup(fen, position)
+            if move in results:
+                return results[move]
+            requested = move
+            if move not in legal and len(move) == 4 and move + "q" in legal:
+                move += "q"  # Превращение без указания фигуры - в ферзя
+            if move not in legal:
+                # Нелегальные ходы не запоминаем: клиент может прислать сколько угодно разных строк
+                return {"legal": False, "position": f"{key:016x}"}
+            child = board.copy(stack=False)
+            child.push_uci(move)
+            child_key = position_key(child)
+            if child_key not in self.positions:
+                self._remember(child_key, child)  # Следующий ход можно проверить по одному хешу
+            result = {
+                "legal": True,
+                "move": move,
+                "fen": child.fen(),
+                "position": f"{child_key:016x}",
+                "status": game_status(child),
+            }
+            results[requested] = result  # Только легальные ходы (и они же без фигуры превращения)
+            return result
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "positions": len(self.positions)}
@@ -0,0 +1,208 @@
+import sys
+import time
+
+import numpy as np
+
+from features import PLANES, FeatureEncoder
+from position import STARTING_FEN, Position
+
+# Статическая оценка позиций пакетами: материал, таблицы фигура-клетка, подвижность и безопасность короля.
+# Работает с плоскостями из features.py, весь пакет оценивается одними операциями NumPy.
+# Оценка в сотых долях пешки с точки зрения белых (evaluate_planes) или стороны, чей ход (Evaluator)
+
+PIECE_VALUES = np.array([100, 320, 330, 500, 900, 0], dtype=np.int32)  # P N B R Q K
+
+# Таблицы фигура-клетка для белых, строка 0 - восьмая горизонталь (как Board.grid)
+PIECE_SQUARE_TABLES = np.array([
+    [  # Пешка
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    [  # Конь
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+    ],
+    [  # Слон
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 10, 10, 5, 0, -10],
+        [-10, 5, 5, 10, 10, 5, 5, -10],
+        [-10, 0, 10, 10, 10, 10, 0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+    ],
+    [  # Ладья
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0],
+    ],
+    [  # Ферзь
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+    ],
+    [  # Король
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20],
+    ],
+], dtype=np.int32)
+
+# Веса всех 12 плоскостей: материал плюс таблица; для черных таблица отражается по вертикали и берется со знаком минус
+PLANE_WEIGHTS = np.concatenate([
+    PIECE_SQUARE_TABLES + PIECE_VALUES[:, None, None],
+    -(PIECE_SQUARE_TABLES[:, ::-1, :] + PIECE_VALUES[:, None, None]),
+])
+
+KNIGHT_STEPS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+KING_STEPS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+ROOK_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+MOBILITY_WEIGHT = 4  # За каждый ход коня, слона, ладьи или ферзя
+SHIELD_WEIGHT = 12  # За каждую пешку прикрытия перед королем
+KING_ATTACK_WEIGHT = 8  # За каждую атакованную клетку вокруг короля
+
+
+def _shift(squares, dy, dx):
+    # Сдвиг пакета досок (N, 8, 8) на (dy, dx) клеток; ушедшее за край отбрасывается
+    shifted = np.zeros_like(squares)
+    shifted[:, max(dy, 0):8 + min(dy, 0), max(dx, 0):8 + min(dx, 0)] = \
+        squares[:, max(-dy, 0):8 + min(-dy, 0), max(-dx, 0):8 + min(-dx, 0)]
+    return shifted
+
+
+def _side_activity(planes, offset, own, empty):
+    # Подвижность фигур стороны (сумма ходов) и карта атакованных ею клеток
+    pawns, knights, bishops, rooks, queens, king = (planes[:, offset + kind].astype(bool) for kind in range(6))
+    forward = -1 if offset == 0 else 1  # Белые пешки идут к строке 0
+    attacks = _shift(pawns, forward, 1) | _shift(pawns, forward, -1)
+    mobility = np.zeros(len(planes), dtype=np.int32)
+
+    for dy, dx in KNIGHT_STEPS:
+        reach = _shift(knights, dy, dx)
+        attacks |= reach
+        mobility += (reach & ~own).sum(axis=(1, 2))
+    for dy, dx in KING_STEPS:
+        attacks |= _shift(king, dy, dx)
+
+    # Дальнобойные фигуры: луч продвигается по пустым клеткам и останавливается на первой занятой
+    for directions, sliders in ((ROOK_DIRECTIONS, rooks | queens), (BISHOP_DIRECTIONS, bishops | queens)):
+        for dy, dx in directions:
+            ray = sliders
+            for _ in range(7):
+                ray = _shift(ray, dy, dx)
+                if not ray.any():
+                    break
+                attacks |= ray
+                mobility += (ray & ~own).sum(axis=(1, 2))
+                ray &= empty
+    return mobility, attacks
+
+
+def _king_safety(planes, offset, enemy_attacks):
+    # Пешки прикрытия перед королем и атакованные соперником клетки вокруг короля
+    king = planes[:, offset + 5].astype(bool)
+    pawns = planes[:, offset].astype(bool)
+    forward = -1 if offset == 0 else 1
+    shield = _shift(king, forward, 0) | _shift(king, forward, 1) | _shift(king, forward, -1)
+    zone = king.copy()
+    for dy, dx in KING_STEPS:
+        zone |= _shift(king, dy, dx)
+    return SHIELD_WEIGHT * (shield & pawns).sum(axis=(1, 2)) - KING_ATTACK_WEIGHT * (zone & enemy_attacks).sum(axis=(1, 2))
+
+
+def evaluate_planes(planes):
+    # Оценка пакета плоскостей (N, 12, 8, 8) с точки зрения белых
+    planes = planes.astype(np.int32)
+    score = np.tensordot(planes, PLANE_WEIGHTS, axes=3)
+
+    white = planes[:, :PLANES // 2].any(axis=1)
+    black = planes[:, PLANES // 2:].any(axis=1)
+    empty = ~(white | black)
+    white_mobility, white_attacks = _side_activity(planes, 0, white, empty)
+    black_mobility, black_attacks = _side_activity(planes, PLANES // 2, black, empty)
+    score += MOBILITY_WEIGHT * (white_mobility - black_mobility)
+    score += _king_safety(planes, 0, black_attacks) - _king_safety(planes, PLANES // 2, white_attacks)
+    return score
+
+
+# Оценщик для встроенного соперника: позиции (Position или FEN) -> оценка для стороны, чей ход
+class Evaluator:
+    def __init__(self, batch_size=4096):
+        self.encoder = FeatureEncoder(batch_size)
+
+    def evaluate_batch(self, positions):
+        scores = []
+        for planes, state in self.encoder.stream(positions):
+            white = evaluate_planes(planes)
+            scores.append(np.where(state[:, 0] == 1, white, -white))
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.int32)
+
+    def evaluate(self, position):
+        return int(self.evaluate_batch([position])[0])
+
+
+def benchmark(batch_size=4096, rounds=20):
+    # Скорость оценки: позиций в секунду на пакетах из случайных партий
+    import random
+
+    positions = []
+    position = Position.from_fen(STARTING_FEN)
+    while len(positions) < batch_size:
+        moves = position.legal_moves()
+        if not moves or position.halfmove_clock >= 100:
+            position = Position.from_fen(STARTING_FEN)
+            continue
+        position = position.apply(random.choice(moves))
+        positions.append(position)
+
+    evaluator = Evaluator(batch_size)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        evaluator.evaluate_batch(positions)
+    elapsed = time.perf_counter() - start
+    return batch_size * rounds / elapsed
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+        print(f"{benchmark(batch_size):.0f} positions/s (batch of {batch_size})")
+    elif len(sys.argv) > 1:
+        print(Evaluator().evaluate(" ".join(sys.argv[1:])))
+    else:
+        print("Usage: python evaluation.py <FEN> | --bench [batch_size]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import csv
+import sys
+import time
+
+import numpy as np
+
+from position import EMPTY, PIECES, Position, parse_square
+
+# Признаки позиций для пакетной обработки: 12 плоскостей 8x8 (по одной на каждый тип фигуры,
+# порядок PIECES, клетки как в Board.grid) и строка состояния партии.
+# Пакет кодируется целиком в заранее выделенные массивы NumPy, без объектов на каждую клетку
+
+PLANES = len(PIECES)
+STATE_FIELDS = ("white_to_move", "K", "Q", "k", "q", "en_passant")  # en_passant - индекс клетки или -1
+
+# Символ фигуры (байт FEN) -> номер плоскости; пустые клетки попадают в лишнюю плоскость PLANES
+PIECE_PLANES = np.full(256, PLANES, dtype=np.uint8)
+for _plane, _piece in enumerate(PIECES.encode()):
+    PIECE_PLANES[_piece] = _plane
+_PLANE_NUMBERS = np.arange(PLANES, dtype=np.uint8)[None, :, None]
+
+# Цифры в FEN раскрываются в пустые клетки: "3p4" -> "...p...."
+_FEN_DIGITS = str.maketrans({str(count): chr(EMPTY) * count for count in range(1, 9)})
+
+
+def _split(position):
+    # (64 байта доски, очередь хода, рокировки, взятие на проходе) из Position или FEN
+    if isinstance(position, Position):
+        return position.board, position.turn == "white", position.castling, position.en_passant
+    parts = position.split()
+    board = parts[0].replace("/", "").translate(_FEN_DIGITS).encode()
+    if len(board) != 64:
+        raise ValueError(f"Invalid FEN: {position}")
+    castling = parts[2] if len(parts) > 2 and parts[2] != "-" else ""
+    en_passant = parse_square(parts[3]) if len(parts) > 3 and parts[3] != "-" else None
+    return board, len(parts) < 2 or parts[1] == "w", castling, en_passant
+
+
+class FeatureEncoder:
+    def __init__(self, batch_size=4096):
+        self.batch_size = batch_size
+        self.planes = np.zeros((batch_size, PLANES, 8, 8), dtype=np.uint8)
+        self.state = np.zeros((batch_size, len(STATE_FIELDS)), dtype=np.int8)
+        self.squares = bytearray(batch_size * 64)  # Доски пакета подряд, по 64 байта
+
+    def encode(self, positions):
+        # Кодирование пакета позиций (Position или FEN); возвращает срезы внутренних массивов,
+        # которые перезаписываются следующим вызовом
+        count = 0
+        state = self.state
+        for position in positions:
+            if count == self.batch_size:
+                raise ValueError(f"Batch is larger than {self.batch_size} positions")
+            board, white, castling, en_passant = _split(position)
+            self.squares[count * 64:count * 64 + 64] = board
+            row = state[count]
+            row[0] = white
+            for index, right in enumerate("KQkq", 1):
+                row[index] = right in castling
+            row[5] = -1 if en_passant is None else en_passant
+            count += 1
+
+        # Все доски пакета разом: байт -> номер плоскости -> сравнение с номерами плоскостей
+        boards = np.frombuffer(self.squares, dtype=np.uint8, count=count * 64).reshape(count, 64)
+        planes = self.planes[:count]
+        np.equal(PIECE_PLANES[boards][:, None, :], _PLANE_NUMBERS, out=planes.reshape(count, PLANES, 64), casting="unsafe")
+        return planes, state[:count]
+
+    def stream(self, positions):
+        # Кодирование потока позиций пакетами по batch_size: память не растет с длиной потока
+        batch = []
+        for position in positions:
+            batch.append(position)
+            if len(batch) == self.batch_size:
+                yield self.encode(batch)
+                batch.clear()
+        if batch:
+            yield self.encode(batch)
+
+
+def encode(positions):
+    # Разовое кодирование последовательности позиций в новые массивы
+    positions = list(positions)
+    planes, state = FeatureEncoder(max(len(positions), 1)).encode(positions)
+    return planes, state
+
+
+def corpus_positions(csv_path, after_first_move=True):
+    # Позиции задачек из выгрузки Lichess; по умолчанию после первого хода соперника, как их видит решающий
+    with open(csv_path, newline="") as file:
+        reader = csv.reader(file)
+        next(reader)  # Заголовок
+        for row in reader:
+            if after_first_move:
+                yield Position.from_fen(row[1]).apply(row[2].split()[0])
+            else:
+                yield row[1]
+
+
+def pgn_positions(pgn_path):
+    # Все позиции всех партий из PGN-файла; партии читаются по одной
+    import chess.pgn
+
+    with open(pgn_path) as file:
+        while True:
+            game = chess.pgn.read_game(file)
+            if game is None:
+                return
+            board = game.board()
+            yield board.fen()
+            for move in game.mainline_moves():
+                board.push(move)
+                yield board.fen()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python features.py <puzzles.csv | games.pgn> [batch_size]")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    encoder = FeatureEncoder(int(sys.argv[2]) if len(sys.argv) > 2 else 4096)
+    positions = pgn_positions(path) if path.endswith(".pgn") else corpus_positions(path)
+
+    count, pieces = 0, 0
+    start = time.perf_counter()
+    for planes, state in encoder.stream(positions):
+        count += len(planes)
+        pieces += int(planes.sum())
+    elapsed = time.perf_counter() - start
+    print(f"{count} positions ({pieces / max(count, 1):.1f} pieces on average) in {elapsed:.2f} s, "
+          f"{count / elapsed if elapsed else 0:.0f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
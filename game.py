@@ -1,27 +1,114 @@
+import time
+STARTUP = time.perf_counter()  # Начало запуска (для --timings)
+
 import pygame as pg
-import mysql.connector
 import sys
 import configparser
-import chess
-import chess.engine
+import heapq
+import threading
+from position import STARTING_FEN, Position, move_from_uci
+
+# Тяжелые модули (mysql.connector, chess.engine, таблицы, кэш анализа, NumPy) импортируются
+# только в тех режимах, где они нужны
 
 # Путь к двигателю Stockfish
 ENGINE = "./stockfish-ubuntu-x86-64-avx2"
 
 # Класс для взаимодействия с шахматным двигателем (например, Stockfish)
 class ChessEngine:
-    def __init__(self, path, depth=15):
+    def __init__(self, path, depth=15, cache=None, ponder=True):
         self.path = path
         self.depth = depth
+        self.cache = cache  # Кэш анализа (AnalysisCache), общий для игр и задачек
         # Запуск двигателя с заданной глубиной анализа
+        import chess.engine
         self.engine = chess.engine.SimpleEngine.popen_uci(path)
+        # Обдумывание на времени соперника: после своего хода двигатель считает ожидаемый ответ
+        self.ponder = ponder and "Ponder" in self.engine.options
+        self.board = None  # Доска партии с историей ходов (по ней python-chess узнает ponderhit)
+
+    def _game_board(self, fen):
+        # Доска партии, продолженная до позиции fen. Если соперник сыграл ожидаемый ход, история
+        # совпадает с обдумываемой позицией и python-chess отправляет ponderhit, иначе - stop и новый поиск
+        import chess
+
+        target = chess.Board(fen)
+        if self.board is not None:
+            for move in self.board.legal_moves:
+                self.board.push(move)
+                if self.board.epd() == target.epd():
+                    return self.board
+                self.board.pop()
+        self.board = target
+        return target
+
+    def get_best_move(self, fen, limit=None):
+        # limit - ограничение поиска (по умолчанию глубина self.depth); поиск по времени в кэш не попадает
+        import chess.engine
+
+        search_depth = limit or chess.engine.Limit(depth=self.depth)
+        board = self._game_board(fen)
+        # Если позиция уже анализировалась с таким ограничением, двигатель не запускаем
+        if self.cache:
+            entry = self.cache.get(fen, search_depth)
+            if entry:
+                if self.ponder:
+                    # Двигатель обдумывает позицию, которой в партии уже не будет: любая команда (ping) его останавливает
+                    self.engine.ping()
+                move = chess.Move.from_uci(entry["move"])
+                board.push(move)
+                return move
+
+        result = self.engine.play(board, search_depth, info=chess.engine.INFO_SCORE | chess.engine.INFO_PV,
+                                  ponder=self.ponder, game=self)
+        # После ponderhit в result.info только строки, пришедшие после него (часто без оценки) - такое не кэшируем
+        if self.cache and "score" in result.info:
+            self.cache.put(fen, search_depth, result.move, result.info)
+        board.push(result.move)
+        return result.move  # Возвращаем лучший ход
+
+    def stream_lines(self, fen, multipv=3, depth=None):
+        # Потоковый анализ: после каждого обновления от двигателя отдаем N лучших вариантов.
+        # Если перестать читать генератор (break), поиск останавливается
+        import chess.engine
 
-    def get_best_move(self, fen):
-        # Преобразуем строку FEN в объект шахматной доски
         board = chess.Board(fen)
-        search_depth = chess.engine.Limit(depth=self.depth)
-        result = self.engine.play(board, search_depth)
-        return result.move  # Возвращаем лучший ход
+        search_depth = chess.engine.Limit(depth=depth or self.depth)
+        lines = {}
+        best_info = None
+        with self.engine.analysis(board, search_depth, multipv=multipv) as analysis:
+            for info in analysis:
+                if "pv" not in info or "score" not in info:
+                    continue
+                index = info.get("multipv", 1)
+                if index == 1:
+                    best_info = info
+                score = info["score"].relative
+                lines[index] = {
+                    "move": info["pv"][0].uci(),
+                    "depth": info.get("depth"),
+                    "cp": score.score(),
+                    "mate": score.mate(),
+                    "pv": [move.uci() for move in info["pv"]],
+                }
+                yield [lines[i] for i in sorted(lines)]
+
+        # Поиск дошел до заданной глубины: лучший вариант можно положить в кэш
+        if self.cache and best_info:
+            self.cache.put(fen, search_depth, best_info["pv"][0], best_info)
+
+    def get_lines(self, fen, multipv=3, depth=None, callback=None):
+        # Анализ с N лучшими вариантами. callback получает промежуточные варианты;
+        # если он возвращает True, варианты уже достаточно хороши и поиск прекращается
+        lines = []
+        stream = self.stream_lines(fen, multipv, depth)
+        try:
+            for lines in stream:
+                if callback and callback(lines):
+                    break
+        finally:
+            stream.close()  # Останавливаем поиск двигателя
+        return lines
 
     def close(self):
         # Закрытие соединения с двигателем
@@ -30,6 +117,8 @@ class ChessEngine:
 # Класс для работы с базой данных шахматных задачек
 class PuzzleDataBase:
     def __init__(self):
+        import mysql.connector
+
         # Чтение конфигурации из файла
         config = configparser.ConfigParser()
         config.read("config.ini")
@@ -76,9 +165,54 @@ class PuzzleDataBase:
 # Размеры доски и клеток
 board_size = 800
 square_size = board_size / 8
-screen = pg.display.set_mode((board_size, board_size))
+screen = None  # Окно создается при первой отрисовке (open_display)
+
+# Собственные события игрового цикла
+SCHEDULER_EVENT = pg.USEREVENT + 1  # Подошло время отложенного действия
+ENGINE_MOVE = pg.USEREVENT + 2  # Двигатель нашел ход (атрибуты start и move - клетки (row, col))
+
+
+def open_display():
+    # Создание окна игры: видеоподсистема pygame запускается только здесь
+    global screen
+    if screen is None:
+        pg.init()
+        screen = pg.display.set_mode((board_size, board_size))
+    return screen
+
+
+# Отложенные действия на одном таймере pygame: таймер всегда взведен на ближайшее действие
+class Scheduler:
+    def __init__(self, event_type=SCHEDULER_EVENT):
+        self.event_type = event_type
+        self.actions = []  # Куча (время в мс, номер, действие)
+        self.counter = 0  # Номер для порядка действий с одинаковым временем
+
+    def call_later(self, delay, action):
+        # Выполнить action через delay мс
+        heapq.heappush(self.actions, (pg.time.get_ticks() + delay, self.counter, action))
+        self.counter += 1
+        self._arm()
+
+    def _arm(self):
+        if self.actions:
+            pg.time.set_timer(self.event_type, max(1, self.actions[0][0] - pg.time.get_ticks()), loops=1)
+        else:
+            pg.time.set_timer(self.event_type, 0)
+
+    def run_due(self):
+        # Выполняем все действия, время которых подошло (по событию таймера)
+        now = pg.time.get_ticks()
+        while self.actions and self.actions[0][0] <= now:
+            _, _, action = heapq.heappop(self.actions)
+            action()
+        self._arm()
+
+    def cancel(self):
+        # Отмена всех отложенных действий
+        self.actions.clear()
+        self._arm()
 
-clock = pg.time.Clock()
 
 # Цвета для светлых и темных клеток доски
 LIGHT = (222, 227, 230)
@@ -94,6 +228,9 @@ class Board:
         self.en_passant_target = None  # Цель для взятия на проходе
         self.halfmove_clock = 0  # Часы половинных ходов (для подсчета 50 ходов без взятия или хода пешки)
         self.fullmove_number = 1  # Номер полного хода
+        self.legal_moves_cache = {}  # Легальные ходы текущей позиции: цвет -> {клетка фигуры: ходы}
+        self.start_fen = STARTING_FEN  # Начальная позиция партии
+        self.move_history = []  # Ходы партии в UCI (для разбора партии)
 
     def draw(self):
         for row in range(8):
@@ -144,7 +281,7 @@ class Board:
 
         fen += f" {"w" if turn == "white" else "b"}"  # Текущий ход
         fen += f" {self._get_castling_rights()}"  # Права на рокировку
-        fen += f" {self.en_passant_target if self.en_passant_target else "-"}"  # Взятие на проходе
+        fen += f" {self._get_en_passant_square()}"  # Взятие на проходе
         fen += f" {self.halfmove_clock}"  # Количество половинных ходов
         fen += f" {self.fullmove_number}"  # Номер полного хода
 
@@ -167,10 +304,19 @@ class Board:
                 rights += "q"
         return rights if rights else "-"
 
+    def _get_en_passant_square(self):
+        # Клетка для взятия на проходе в нотации FEN (например, 'e3')
+        if not self.en_passant_target:
+            return "-"
+        row, col = self.en_passant_target
+        return f"{chr(ord("a") + col)}{8 - row}"
 
     # Инициализация фигур на их начальных позициях или по FEN
     def setup(self, fen=None):
         self.grid = [[None for _ in range(8)] for _ in range(8)]
+        self.legal_moves_cache = {}
+        self.start_fen = fen or STARTING_FEN
+        self.move_history = []
         if fen:
             parts = fen.split()  # Разбиваем FEN на компоненты
             lines, castling, en_passant = parts[0], parts[2], parts[3]
@@ -265,33 +411,38 @@ class Board:
                         return True
         return False
 
+    def get_all_legal_moves(self, color):
+        # Все легальные ходы стороны по клеткам фигур; считаются один раз, пока позиция не изменится
+        if color not in self.legal_moves_cache:
+            moves = {}
+            for row in range(8):
+                for col in range(8):
+                    piece = self.grid[row][col]
+                    if piece and piece.color == color:
+                        legal_moves = piece.get_legal_moves(self)
+                        if legal_moves:
+                            moves[(row, col)] = legal_moves
+            self.legal_moves_cache[color] = moves
+        return self.legal_moves_cache[color]
+
+    def get_legal_moves_from(self, row, col):
+        # Легальные ходы фигуры на клетке (из общего списка позиции)
+        piece = self.grid[row][col]
+        if piece is None:
+            return []
+        return self.get_all_legal_moves(piece.color).get((row, col), [])
+
     def is_checkmate(self, color):
         # Проверка, мат ли королю данного цвета
-        if not self.is_check(color):
+        if self.get_all_legal_moves(color):  # Если есть легальные ходы, то не мат
             return False
-
-        for row in range(8):
-            for col in range(8):
-                piece = self.grid[row][col]
-                if piece and piece.color == color:
-                    legal_moves = piece.get_legal_moves(self)
-                    if len(legal_moves) > 0:  # Если есть легальные ходы, то не пат
-                        return False
-        return True
+        return self.is_check(color)
 
     def is_pat(self, color):
         # Проверка, пат ли королю данного цвета
-        if self.is_check(color):
+        if self.get_all_legal_moves(color):
             return False
-
-        for row in range(8):
-            for col in range(8):
-                piece = self.grid[row][col]
-                if piece and piece.color == color:
-                    legal_moves = piece.get_legal_moves(self)
-                    if len(legal_moves) > 0:
-                        return False
-        return True
+        return not self.is_check(color)
 
     def highlight_moves(self, moves, selected_piece):
         # Подсветка доступных ходов
@@ -311,6 +462,7 @@ class Board:
         # Выполнение хода фигуры
         _row, _col = piece.position
         self.grid[_row][_col] = None
+        self.legal_moves_cache = {}  # Позиция меняется - ходы нужно пересчитать
 
         # Правило 50 ходов
         if isinstance(piece, Pawn) or not self.is_blank(row, col):
@@ -325,6 +477,12 @@ class Board:
             else:
                 self.grid[row - 1][col] = None
 
+        # Клетка для взятия на проходе после двойного хода пешки
+        if isinstance(piece, Pawn) and abs(row - _row) == 2:
+            self.en_passant_target = ((row + _row) // 2, col)
+        else:
+            self.en_passant_target = None
+
         # Рокировка
         if isinstance(piece, King) and abs(col - _col) == 2:
             if col > _col:
@@ -338,6 +496,10 @@ class Board:
                 self.grid[_row][3] = rook
                 rook.position = (_row, 3)
 
+        # Ход в истории партии (пешка всегда превращается в ферзя)
+        promotion = "q" if isinstance(piece, Pawn) and (row == 0 or row == 7) else ""
+        self.move_history.append(f"{chr(ord("a") + _col)}{8 - _row}{chr(ord("a") + col)}{8 - row}{promotion}")
+
         # Превращение пешки
         if isinstance(piece, Pawn) and (row == 0 or row == 7):
             self.grid[row][col] = piece = Queen(piece.color, (row, col))
@@ -633,6 +795,73 @@ class Pawn(Piece):
         return moves
 
 
+# Шахматные часы: контроль вида "5+3" (минуты на партию + секунды добавки за ход)
+class ChessClock:
+    def __init__(self, minutes, increment=0):
+        self.increment = increment
+        self.times = {"white": minutes * 60.0, "black": minutes * 60.0}  # Остаток на момент последнего переключения
+        self.turn = None  # Чьи часы идут
+        self.started = None
+
+    @classmethod
+    def parse(cls, control):
+        minutes, _, increment = control.partition("+")
+        return cls(float(minutes), float(increment or 0))
+
+    def remaining(self, color):
+        # Оставшееся время стороны в секундах
+        left = self.times[color]
+        if color == self.turn:
+            left -= time.monotonic() - self.started
+        return max(left, 0.0)
+
+    def switch(self, color):
+        # Переключение часов на сторону color; сходившая сторона получает добавку
+        if color == self.turn:
+            return
+        now = time.monotonic()
+        if self.turn is not None:
+            self.times[self.turn] += self.increment - (now - self.started)
+        self.turn, self.started = color, now
+
+    def stop(self):
+        if self.turn is not None:
+            self.times[self.turn] = self.remaining(self.turn)
+            self.turn = None
+
+    def flagged(self, color):
+        return self.remaining(color) <= 0
+
+    def format(self, color):
+        minutes, seconds = divmod(int(-(-self.remaining(color) // 1)), 60)
+        return f"{minutes}:{seconds:02}"
+
+
+# Распределение времени компьютера: доля оставшегося времени и добавки, больше в сложных позициях
+class TimeManager:
+    def __init__(self, moves_to_go=30, safety=0.1):
+        self.moves_to_go = moves_to_go  # На сколько ходов вперед делим оставшееся время
+        self.safety = safety  # Запас на задержки (секунды), чтобы не просрочить время
+
+    def budget(self, remaining, increment, complexity):
+        # Время на ход (секунды); complexity - число легальных ходов, в среднем около 30
+        share = remaining / self.moves_to_go + increment * 0.8
+        share *= min(max(complexity / 30, 0.5), 1.5)
+        return max(0.01, min(share, remaining / 2 - self.safety))
+
+    def limit(self, clock, color, complexity):
+        # Ограничение поиска для двигателя: часы обеих сторон (wtime/btime/winc/binc) и время на ход (movetime)
+        import chess.engine
+
+        return chess.engine.Limit(
+            white_clock=clock.remaining("white"),
+            black_clock=clock.remaining("black"),
+            white_inc=clock.increment,
+            black_inc=clock.increment,
+            time=self.budget(clock.remaining(color), clock.increment, complexity),
+        )
+
+
 class Man:
     def __init__(self, color):
         self.color = color
@@ -642,20 +871,75 @@ class Man:
 
 
 class Computer:
-    def __init__(self, color, engine, depth=15):
+    def __init__(self, color, engine, depth=15, tablebase=None, evaluator=None, clock=None, searcher=None):
         self.color = color
-        self.engine = engine
-
-    def find_move(self, board):
-        # Преобразуем текущее состояние доски в формат FEN и используем двигатель для поиска лучшего хода
-        fen = board._get_fen(self.color)
-        start, end = board.translate_to_coordinates(str(self.engine.get_best_move(fen)))
-        piece = board.grid[start[0]][start[1]]
-        return piece, end
+        self.engine = engine  # Без двигателя ход ищет встроенный поиск searcher или статическая оценка evaluator
+        self.tablebase = tablebase  # Эндшпильные таблицы (необязательно)
+        self.evaluator = evaluator
+        self.searcher = searcher  # Параллельный поиск (search.ParallelSearch)
+        self.clock = clock  # Шахматные часы партии: с ними время на ход считает TimeManager
+        self.time_manager = TimeManager()
+
+    def snapshot(self, board):
+        # Все, что нужно для поиска хода, снимается с доски в главном потоке: поток двигателя
+        # работает только с неизменяемыми данными и не трогает живую доску, которую рисует главный поток
+        legal_moves = tuple((start, tuple(moves)) for start, moves in board.get_all_legal_moves(self.color).items())
+        return board._get_fen(self.color), Position.from_board(board, self.color), legal_moves
+
+    def find_move(self, snapshot):
+        # Ход по снимку позиции: (клетка фигуры, клетка назначения)
+        fen, position, legal_moves = snapshot
+        move = None
+        # Единственный легальный ход делаем сразу, без двигателя
+        if len(legal_moves) == 1 and len(legal_moves[0][1]) == 1:
+            return legal_moves[0][0], legal_moves[0][1][0]
+        # Если фигур осталось мало, берем идеальный ход из таблиц и не запускаем двигатель
+        if self.tablebase:
+            import chess
+            move = self.tablebase.best_move(chess.Board(fen))
+        complexity = sum(len(moves) for _, moves in legal_moves)
+        if move is None and self.engine is None:
+            if self.searcher:
+                return self._search_move(position, complexity)
+            return self._evaluate_moves(position)
+        if move is None:
+            limit = None
+            if self.clock:
+                limit = self.time_manager.limit(self.clock, self.color, complexity)
+            move = self.engine.get_best_move(fen, limit)
+        start, end, _ = move_from_uci(str(move))
+        return divmod(start, 8), divmod(end, 8)
+
+    def fallback_move(self, snapshot):
+        # Ход, если поиск упал: статическая оценка, а без нее - случайный легальный ход
+        if self.evaluator:
+            return self._evaluate_moves(snapshot[1])
+        import random
+        start, moves = random.choice(snapshot[2])
+        return start, random.choice(moves)
+
+    def _evaluate_moves(self, position):
+        # Ход без двигателя: все позиции после наших ходов оцениваются одним пакетом,
+        # выбираем ту, что хуже всего для соперника (пешка всегда превращается в ферзя, как в move_piece)
+        moves = [move for move in position.legal_moves() if move[2] in ("", "q")]
+        scores = self.evaluator.evaluate_batch([position.apply(move) for move in moves])
+        start, end, _ = moves[int(scores.argmin())]
+        return divmod(start, 8), divmod(end, 8)
+
+    def _search_move(self, position, complexity):
+        # Ход встроенного поиска: до глубины из настроек или, в партии на время, пока не кончится бюджет хода
+        moves = [move for move in position.legal_moves() if move[2] in ("", "q")]
+        if self.clock:
+            budget = self.time_manager.budget(self.clock.remaining(self.color), self.clock.increment, complexity)
+            (start, end, _), _, _ = self.searcher.search(position, depth=64, time_limit=budget, moves=moves)
+        else:
+            (start, end, _), _, _ = self.searcher.search(position, moves=moves)
+        return divmod(start, 8), divmod(end, 8)
 
     def close(self):
         # Закрываем двигатель после работы
-        self.engine.close()
+        if self.engine:
+            self.engine.close()
 
 
 class Game:
@@ -672,8 +956,18 @@ class Game:
         self.mode = None
         self.puzzle_moves = []  # Верные ходы для задачек
         self.step_index = None
-        self.think_time = 0  # Время на подумать для компьютера
+        self.scheduler = Scheduler()  # Отложенные действия (ход компьютера, ответ в задачке)
+        self.worker = None  # Поток, в котором думает двигатель
+        self.closed = False  # Окно закрыто пользователем
         self.points = 0  # Количество очков за решение задачек
+        self.attempts = None  # Журнал попыток (AttemptLog), если задачка из базы
+        self.puzzle_id = None
+        self.puzzle_started = None  # Время начала задачки
+        self.mistakes = 0  # Неверные ходы в текущей задачке
+        self.tablebase = None  # Эндшпильные таблицы для проверки задачек
+        self.timings = None  # Замеры запуска (Timings), отчет после первого кадра
+        self.clock = None  # Шахматные часы (ChessClock), если партия на время
+        self.result = "*"  # Результат партии для PGN
 
         # Игроки (Man | Computer)
         self.player_w = None
@@ -697,72 +991,110 @@ class Game:
             self.puzzle_moves = puzzle_moves.split()
             self.step_index = 0
             self.turn = "white" if turn == "w" else "black"
+            self.mistakes = 0
+            self.puzzle_started = time.monotonic()
         self.board.setup(fen)  # Если fen is None, то фигуры встают на начальные позиции
 
     def run(self):
-        # Главный игровой цикл
+        # Главный игровой цикл: процесс спит в pg.event.wait, пока нет событий (клики, таймеры, ход двигателя)
+        open_display()
+        pg.event.set_blocked(pg.MOUSEMOTION)  # Движения мыши не нужны - не будим цикл
+        self.draw()
+        self.after_move()
+        if self.clock:
+            self.tick()
         while self.running:
-            for event in pg.event.get():
-                self.handle_event(event)  # Работа с событиями
+            self.handle_event(pg.event.wait())
+            if self.running:
+                self.draw()
+        self.scheduler.cancel()
 
-            if not self.running:
-                break
+    def draw(self):
+        # Перерисовываем игровое поле
+        screen.fill(LIGHT)
+        self.board.draw()
+        self.board.highlight_moves(self.legal_moves, self.selected_piece)
+        pg.display.flip()
+        if self.timings:
+            self.timings.mark("first frame")
+            self.timings.report()
+            self.timings = None
+
+    def tick(self):
+        # Часы: обновляем заголовок окна и проверяем флаг; следующая проверка - через секунду или в момент падения флага
+        if not self.running:
+            return
+        pg.display.set_caption(f"White {self.clock.format("white")}  |  Black {self.clock.format("black")}")
+        if self.clock.flagged(self.turn):
+            print(f"Time out! {self.turn.capitalize()} loses!")
+            self.result = "0-1" if self.turn == "white" else "1-0"
+            self.running = False
+            self.clock.stop()
+            return
+        self.scheduler.call_later(min(1000, int(self.clock.remaining(self.turn) * 1000) + 1), self.tick)
+
+    def after_move(self):
+        # Проверки на конец игры и планирование следующего действия после каждого хода
+        if self.clock:
+            self.clock.switch(self.turn)
+        if self.board.halfmove_clock >= 50:
+            print("Draw by 50-move rule!")
+            self.result = "1/2-1/2"
+            self.running = False
+        if self.board.is_threefold_repetition():
+            print("Draw by threefold repetition!")
+            self.result = "1/2-1/2"
+            self.running = False
+        if self.board.is_checkmate(self.turn):
+            print(f"Checkmate! {self.turn.capitalize()} loses!")
+            self.result = "0-1" if self.turn == "white" else "1-0"
+            self.running = False
+        if self.board.is_pat(self.turn):
+            print(f"Stalemate! {self.turn.capitalize()} draws!")
+            self.result = "1/2-1/2"
+            self.running = False
 
-            # Проверки на конец игры
-            if self.board.halfmove_clock >= 50:
-                print("Draw by 50-move rule!")
-                self.running = False
-            if self.board.is_threefold_repetition():
-                print("Draw by threefold repetition!")
-                self.running = False
-            if self.board.is_checkmate(self.turn):
-                print(f"Checkmate! {self.turn.capitalize()} loses!")
+        if self.mode == "puzzle":
+            if self.step_index == len(self.puzzle_moves):
+                print("Puzzle solved!")
+                self.points += 1
+                self.record_attempt(True)
                 self.running = False
-            if self.board.is_pat(self.turn):
-                print(f"Stalemate! {self.turn.capitalize()} draws!")
-                self.running = False
-            
-            if self.mode == "puzzle":
-                if self.step_index == len(self.puzzle_moves):
-                    print("Puzzle solved!")
-                    self.running = False
-
-            # Переворот доски, если играют два человека
-            if self.running and self.last_turn != self.turn and self.mode == "normal" and isinstance(self.player_w, Man) and isinstance(self.player_b, Man):
-                self.board.flip()
-                self.last_turn = self.turn
-
-            # Если играет компьютер, то добавляем delay
-            running_time = pg.time.get_ticks()
-
-            if self.turn == "white" and isinstance(self.player_w, Computer) or self.turn == "black" and isinstance(self.player_b, Computer):
-                if not self.think_time:
-                    self.think_time = running_time + 2000
-                if running_time > self.think_time:
-                    if self.turn == "white":
-                        self.handle_turn(self.player_w)
-                    else:
-                        self.handle_turn(self.player_b)
-                    self.think_time = 0
-
-            # Delay в задачках
-            if self.mode == "puzzle" and self.step_index % 2 == 0:
-                start, end = self.board.translate_to_coordinates(self.puzzle_moves[self.step_index])
-                if not self.think_time:
-                    self.think_time = running_time + 1000
-                if running_time > self.think_time:
-                    self.board.move_piece(self.board.grid[start[0]][start[1]], end[0], end[1])
-                    self.turn = "black" if self.turn == "white" else "white"
-                    self.step_index += 1
-                    self.think_time = 0
 
-            # Перерисовываем игровое поле
-            screen.fill(LIGHT)
-            self.board.draw()
-            self.board.highlight_moves(self.legal_moves, self.selected_piece)
-            pg.display.flip()
+        if not self.running:
+            if self.clock:
+                self.clock.stop()
+            return
 
-            clock.tick(30)  # FPS
+        # Переворот доски, если играют два человека
+        if self.last_turn != self.turn and self.mode == "normal" and isinstance(self.player_w, Man) and isinstance(self.player_b, Man):
+            self.board.flip()
+            self.last_turn = self.turn
+
+        # Если играет компьютер, то добавляем delay (в партии на время компьютер ходит сразу - его время идет)
+        player = self.player_w if self.turn == "white" else self.player_b
+        if isinstance(player, Computer):
+            self.scheduler.call_later(0 if self.clock else 2000, lambda: self.handle_turn(player))
+
+        # Delay в задачках
+        if self.mode == "puzzle" and self.step_index % 2 == 0:
+            self.scheduler.call_later(1000, self.play_puzzle_move)
+
+    def record_attempt(self, solved):
+        # Результат задачки в журнал попыток (один раз на задачку); запись в базу - в фоне
+        if self.attempts and self.puzzle_id and self.puzzle_started is not None:
+            self.attempts.record(self.puzzle_id, solved, self.mistakes, round(time.monotonic() - self.puzzle_started, 1))
+        self.puzzle_started = None
+
+    def play_puzzle_move(self):
+        # Ход соперника в задачке
+        if not self.running:
+            return
+        start, end = self.board.translate_to_coordinates(self.puzzle_moves[self.step_index])
+        self.board.move_piece(self.board.grid[start[0]][start[1]], end[0], end[1])
+        self.turn = "black" if self.turn == "white" else "white"
+        self.step_index += 1
+        self.after_move()
 
     def handle_turn(self, player):
         # Обработка хода игрока
@@ -770,21 +1102,59 @@ class Game:
             return  # Ход обрабатывается через события
         elif isinstance(player, Computer):
             if self.running:
-                piece, move = player.find_move(self.board)
-                if piece and move:
-                    row, col = move
-                    self.board.move_piece(piece, row, col)
-                    self.turn = "black" if self.turn == "white" else "white"
+                # Двигатель думает в отдельном потоке, результат приходит событием ENGINE_MOVE
+                snapshot = player.snapshot(self.board)
+                self.worker = threading.Thread(target=self.find_move, args=(player, snapshot), daemon=True)
+                self.worker.start()
+
+    def find_move(self, player, snapshot):
+        # Поиск хода компьютера (в потоке worker)
+        try:
+            start, move = player.find_move(snapshot)
+        except Exception as error:
+            if not self.running:
+                return  # Игру закрыли во время поиска: двигатель уже остановлен
+            # Ошибка поиска не должна оставить игру ждать хода, которого не будет
+            print(f"Error: move search failed ({error!r}), playing a fallback move")
+            start, move = player.fallback_move(snapshot)
+        pg.event.post(pg.event.Event(ENGINE_MOVE, start=start, move=move))
 
     def handle_event(self, event):
         # Обработка событий PyGame
         if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
             self.running = False
-            pg.quit()
+            self.closed = True
+        elif event.type == SCHEDULER_EVENT:
+            self.scheduler.run_due()
+        elif event.type == ENGINE_MOVE:
+            piece = self.board.grid[event.start[0]][event.start[1]] if event.start else None
+            if self.running and piece and event.move:
+                row, col = event.move
+                self.board.move_piece(piece, row, col)
+                self.turn = "black" if self.turn == "white" else "white"
+                self.after_move()
         elif event.type == pg.MOUSEBUTTONDOWN:
             row, col = self.board._translate_coordinates(int(event.pos[1] / square_size), int(event.pos[0] / square_size))
             self.handle_click(row, col)
 
+    def shutdown(self):
+        # Остановка игры: отменяем отложенные действия и дожидаемся потока двигателя
+        self.running = False
+        if pg.get_init():
+            self.scheduler.cancel()
+        if self.worker:
+            self.worker.join()
+
+    def is_winning_alternative(self, row, col):
+        # Проверка хода по эндшпильным таблицам
+        if not self.tablebase:
+            return False
+        start_row, start_col = self.selected_piece.position
+        move = f"{chr(ord("a") + start_col)}{8 - start_row}{chr(ord("a") + col)}{8 - row}"
+        if isinstance(self.selected_piece, Pawn) and row in (0, 7):
+            move += "q"  # Пешка всегда превращается в ферзя
+        return bool(self.tablebase.is_winning_move(self.board._get_fen(self.turn), move))
+
     def handle_click(self, row, col):
         # Обработка кликов мыши
         player = self.player_w if self.turn == "white" else self.player_b
@@ -796,13 +1166,14 @@ class Game:
         if piece and piece.color == self.turn:
                 # Выделяем фигуру и показываем её легальные ходы
                 self.selected_piece = piece
-                self.legal_moves = piece.get_legal_moves(self.board)
+                self.legal_moves = self.board.get_legal_moves_from(row, col)
         elif self.selected_piece and (row, col) in self.legal_moves:
             # Выполняем ход
             if self.mode == "normal":
                 if self.running:
                     self.board.move_piece(self.selected_piece, row, col)
                     self.turn = "black" if self.turn == "white" else "white"
+                    self.after_move()
             elif self.mode == "puzzle":
                 # Проверяем правильность хода в задаче
                 if self.step_index % 2 != 0:
@@ -813,22 +1184,70 @@ class Game:
                         self.turn = "black" if self.turn == "white" else "white"
                         if self.step_index + 1 < len(self.puzzle_moves):
                             self.step_index += 1
+                        else:
+                            self.step_index = len(self.puzzle_moves)
+                        self.after_move()
+                    elif self.is_winning_alternative(row, col):
+                        # Другой ход, который по таблицам тоже выигрывает, засчитываем как решение
+                        self.board.move_piece(self.selected_piece, row, col)
+                        self.turn = "black" if self.turn == "white" else "white"
+                        self.step_index = len(self.puzzle_moves)
+                        self.after_move()
+                    else:
+                        self.mistakes += 1
             self.selected_piece = None
             self.legal_moves = []
         else:
             self.legal_moves = []
 
 
-def main():
-    pg.init()  # Инициализация Pygame
+# Замеры времени запуска по этапам (python game.py ... --timings)
+class Timings:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = STARTUP
+        self.steps = []
+
+    def mark(self, name):
+        # Конец очередного этапа запуска
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        for name, seconds in self.steps:
+            print(f"{name:<16}{seconds * 1000:8.1f} ms")
+        print(f"{'total':<16}{(self.last - STARTUP) * 1000:8.1f} ms")
+
+
+def review_game(board, result):
+    # Разбор законченной партии пулом двигателей (review.py) и сохранение PGN с пометками
+    from analysis_cache import AnalysisCache
+    from review import GameReview
+
+    cache = AnalysisCache()  # Позиции, которые двигатель уже считал во время партии, берутся из кэша
+    reviewer = GameReview(ENGINE, cache=cache)
+    try:
+        game, _ = reviewer.review(board.move_history, board.start_fen, {"Date": time.strftime("%Y.%m.%d"), "Result": result})
+    finally:
+        reviewer.close()
+        cache.close()
+    path = f"review-{time.strftime("%Y%m%d-%H%M%S")}.pgn"
+    with open(path, "w") as file:
+        print(game, file=file)
+    print(game.comment)
+    print(f"Review saved to {path}")
 
-    # Создаем основной объект игры, базу данных задачек и шахматный двигатель
-    game = Game()
-    puzzle_db = PuzzleDataBase()
-    engine = ChessEngine(ENGINE)  # Инициализация шахматного двигателя
 
+def main():
     # Считываем аргументы командной строки
     args = sys.argv
+    timings = Timings("--timings" in args)
+    review = "--review" in args  # Разобрать партию после окончания
+    args = [arg for arg in args if arg not in ("--timings", "--review")]
+    timings.mark("imports")
 
     # Проверка на минимальное количество аргументов
     if len(args) < 2:
@@ -841,6 +1260,11 @@ def main():
         print(f"Error: '{mode}' is not a valid mode. Enter 'normal' or 'puzzle'.")
         sys.exit(1)
 
+    # Создаем основной объект игры; база задачек, двигатель, кэш и таблицы создаются, только если нужны режиму
+    game = Game()
+    game.timings = timings
+    resources = []  # Что нужно закрыть после игры
+
     if mode == "normal":
         foe = "man"
         color = "white"
@@ -848,8 +1272,8 @@ def main():
         # Проверка аргументов для определения соперника
         if len(args) > 2:
             foe = args[2].lower()
-            if foe not in ("man", "computer"):
-                print(f"Error: '{foe}' is not a valid foe. Enter 'man' or 'computer'.")
+            if foe not in ("man", "computer", "builtin"):
+                print(f"Error: '{foe}' is not a valid foe. Enter 'man', 'computer' or 'builtin'.")
                 sys.exit(1)
 
         # Проверка аргументов для выбора цвета
@@ -859,17 +1283,50 @@ def main():
                 print("Error: Invalid color. Enter 'white' or 'black'.")
                 sys.exit(1)
 
+        # Контроль времени, например 5+3
+        if len(args) > 4:
+            try:
+                game.clock = ChessClock.parse(args[4])
+            except ValueError:
+                print("Error: Invalid time control. Enter minutes and increment, e.g. '5+3'.")
+                sys.exit(1)
+
         # Настройка игры
         game.set(mode)
+        timings.mark("board")
 
         # Настройка игроков в зависимости от выбранного соперника
         if foe == "man":
             game.set_players(Man("white"), Man("black"))
+        elif foe == "builtin":
+            # Встроенный соперник без Stockfish: параллельный поиск со статической оценкой
+            from search import ParallelSearch
+            try:
+                searcher = ParallelSearch.from_config()  # Число процессов и глубина - в разделе [search] config.ini
+            except ValueError as error:
+                print(f"Error: {error}")
+                sys.exit(1)
+            resources.append(searcher)
+            timings.mark("search workers")
+            game.set_players(Man(color), Computer("black" if color == "white" else "white", None, clock=game.clock, searcher=searcher))
         else:
-            game.set_players(Man(color), Computer("black" if color == "white" else "white", engine))
+            from analysis_cache import AnalysisCache
+            from tablebase import Tablebase
+
+            cache = AnalysisCache()  # Кэш анализа позиций между запусками
+            resources.append(cache)
+            timings.mark("analysis cache")
+            tablebase = Tablebase.from_config()  # Эндшпильные таблицы, если указаны в config.ini
+            if tablebase:
+                resources.append(tablebase)
+                timings.mark("tablebase")
+            engine = ChessEngine(ENGINE, cache=cache)  # Инициализация шахматного двигателя
+            resources.append(engine)
+            timings.mark("engine")
+            game.set_players(Man(color), Computer("black" if color == "white" else "white", engine, tablebase=tablebase, clock=game.clock))
 
         # Если пользователь играет черными против компьютера, переворачиваем доску
-        if color == "black" and foe == "computer":
+        if color == "black" and foe != "man":
             game.board.flip()
             pass
 
@@ -887,28 +1344,55 @@ def main():
             sys.exit(1)
 
         # Загрузка задачки из базы данных
-        try:
-            puzzle = puzzle_db.get_puzzle(puzzle_index)
-        except ValueError:
+        puzzle_db = PuzzleDataBase()
+        resources.append(puzzle_db)
+        timings.mark("database")
+        puzzle = puzzle_db.get_puzzle(puzzle_index)
+        if puzzle is None:
             print(f"Error: No puzzle found for index {puzzle_index}")
+            puzzle_db.close()
             exit(1)
 
         # Настройка игры
         game.set(mode, fen=puzzle[1], puzzle_moves=puzzle[2])
+        game.puzzle_id = puzzle[0]
+        timings.mark("puzzle")
+
+        # Попытки и NbPlays пишутся в базу пачками из фонового потока, решение задачки базу не ждет
+        from attempts import AttemptLog
+        game.attempts = AttemptLog()
+        resources.append(game.attempts)
+
+        from tablebase import Tablebase
+        game.tablebase = Tablebase.from_config()  # Эндшпильные таблицы, если указаны в config.ini
+        if game.tablebase:
+            resources.append(game.tablebase)
+            timings.mark("tablebase")
 
     # Запуск игры
     try:
         game.run()
     finally:
-        # Закрытие ресурсов после завершения игры
-        engine.close()  # Закрываем двигатель
-        puzzle_db.close()  # Закрываем базу данных задачек
-
-    while True:
-        for event in pg.event.get():
-            if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                pg.quit()
-                sys.exit(0)
+        if mode == "puzzle":
+            game.record_attempt(False)  # Окно закрыто, а задачка не решена
+        # Закрытие ресурсов после завершения игры (двигатель, кэш анализа, база задачек, журнал попыток, таблицы)
+        for resource in reversed(resources):
+            resource.close()
+        game.shutdown()
+
+    # Разбор партии идет в фоне, пока на экране итоговая позиция
+    reviewer = None
+    if review and mode == "normal" and game.board.move_history:
+        reviewer = threading.Thread(target=review_game, args=(game.board, game.result))
+        reviewer.start()
+
+    # Партия закончена: показываем итоговую позицию, пока окно не закроют
+    while not game.closed:
+        event = pg.event.wait()
+        game.closed = event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE
+    pg.quit()
+    if reviewer:
+        reviewer.join()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,267 @@
+import argparse
+import configparser
+import csv
+import hashlib
+import io
+import os
+import sys
+import time
+import zlib
+
+import chess
+import numpy as np
+
+# Импорт выгрузки задачек Lichess (lichess_db_puzzle.csv.zst) без LOAD DATA INFILE: файл читается потоком
+# прямо из архива, строки проходят цепочку генераторов (чтение -> отбор измененных -> проверка -> пачки)
+# и записываются пачками многострочных upsert'ов. Контрольные суммы строк сохраняются после импорта,
+# поэтому повторный импорт новой выгрузки пишет только новые и измененные задачки
+
+COLUMNS = ("PuzzleId", "FEN", "Moves", "Rating", "RatingDeviation", "Popularity", "NbPlays", "Themes", "GameUrl", "OpeningTags")
+INTEGER_COLUMNS = ("Rating", "RatingDeviation", "Popularity", "NbPlays")
+BATCH_SIZE = 5000
+PROGRESS_EVERY = 100000
+
+
+def open_dump(path):
+    # Текстовый поток из .csv или .csv.zst (zstandard нужен только для сжатых файлов)
+    if not path.endswith(".zst"):
+        return open(path, newline="")
+    import zstandard
+
+    stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+
+def read_rows(file):
+    # Строки выгрузки в порядке COLUMNS (порядок столбцов берется из заголовка)
+    reader = csv.reader(file)
+    header = next(reader)
+    order = [header.index(column) if column in header else None for column in COLUMNS]
+    for row in reader:
+        yield tuple(row[index] if index is not None and index < len(row) else "" for index in order)
+
+
+def id_hash(puzzle_id):
+    return int.from_bytes(hashlib.blake2b(puzzle_id.encode(), digest_size=8).digest(), "big")
+
+
+def row_crc(row):
+    return zlib.crc32("\x1f".join(str(value) for value in row).encode())
+
+
+# Контрольные суммы импортированных задачек: отсортированные хеши PuzzleId и CRC строк
+class ImportState:
+    def __init__(self, hashes=None, crcs=None):
+        self.hashes = np.zeros(0, dtype=np.uint64) if hashes is None else hashes
+        self.crcs = np.zeros(0, dtype=np.uint32) if crcs is None else crcs
+
+    @classmethod
+    def load(cls, path):
+        if not path or not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data["hashes"], data["crcs"])
+
+    @classmethod
+    def from_rows(cls, rows):
+        hashes, crcs = [], []
+        for row in rows:
+            hashes.append(id_hash(row[0]))
+            crcs.append(row_crc(row))
+        return cls.build(np.array(hashes, dtype=np.uint64), np.array(crcs, dtype=np.uint32))
+
+    @classmethod
+    def build(cls, hashes, crcs):
+        order = np.argsort(hashes)
+        return cls(hashes[order], crcs[order])
+
+    def save(self, path):
+        temporary = path + ".tmp.npz"
+        np.savez(temporary, hashes=self.hashes, crcs=self.crcs)
+        os.replace(temporary, path)
+
+    def changed(self, hashes, crcs):
+        # Маска строк пачки, которых нет в состоянии или у которых изменилась CRC
+        if not len(self.hashes):
+            return np.ones(len(hashes), dtype=bool)
+        index = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return (self.hashes[index] != hashes) | (self.crcs[index] != crcs)
+
+
+def select_changed(rows, state, seen, batch_size=BATCH_SIZE):
+    # Отбор новых и измененных строк пачками (сравнение векторное): (строка, хеш PuzzleId, CRC).
+    # В seen сразу попадают суммы неизмененных строк, измененные добавляются только после записи
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield from _changed_in(batch, state, seen)
+            batch = []
+    if batch:
+        yield from _changed_in(batch, state, seen)
+
+
+def _changed_in(batch, state, seen):
+    hashes = np.fromiter((id_hash(row[0]) for row in batch), dtype=np.uint64, count=len(batch))
+    crcs = np.fromiter((row_crc(row) for row in batch), dtype=np.uint32, count=len(batch))
+    changed = state.changed(hashes, crcs)
+    seen.append((hashes[~changed], crcs[~changed]))
+    for index in np.flatnonzero(changed):
+        yield batch[index], hashes[index], crcs[index]
+
+
+def validate(row):
+    # Проверка строки: FEN, легальность всех ходов и числовые поля; возвращает строку с int или None
+    try:
+        board = chess.Board(row[1])
+        if not board.is_valid() or not row[2]:
+            return None
+        for move in row[2].split():
+            board.push_uci(move)  # Нелегальный ход - исключение
+        values = list(row)
+        for column in INTEGER_COLUMNS:
+            index = COLUMNS.index(column)
+            values[index] = int(values[index])
+        return tuple(values)
+    except ValueError:
+        return None
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Запись в таблицу puzzles: многострочный INSERT ... ON DUPLICATE KEY UPDATE на каждую пачку
+class MySQLBackend:
+    def __init__(self, config_file="config.ini"):
+        import mysql.connector
+
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        self.connection = mysql.connector.connect(
+            host=config["mysql"]["host"],
+            user=config["mysql"]["user"],
+            password=config["mysql"]["password"],
+            database=config["mysql"]["database"]
+        )
+        self.cursor = self.connection.cursor()
+        self.row = "(" + ", ".join(["%s"] * len(COLUMNS)) + ")"
+        # NbPlays не затираем: к числу из выгрузки AttemptLog (attempts.py) добавляет свои попытки
+        self.update = ", ".join(f"{column} = GREATEST(NbPlays, VALUES(NbPlays))" if column == "NbPlays" else f"{column} = VALUES({column})"
+                                for column in COLUMNS[1:])
+
+    def existing_rows(self):
+        # Все задачки из базы (для первого импорта без сохраненного состояния)
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM puzzles")
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple("" if value is None else value for value in row)
+        cursor.close()
+
+    def write(self, rows):
+        query = (f"INSERT INTO puzzles ({', '.join(COLUMNS)}) VALUES {', '.join([self.row] * len(rows))} "
+                 f"ON DUPLICATE KEY UPDATE {self.update}")
+        self.cursor.execute(query, [value for row in rows for value in row])
+        self.connection.commit()
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+
+# Запись в CSV (например, для corpus.py или LOAD DATA): только новые и измененные строки
+class CSVBackend:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def existing_rows(self):
+        return iter(())
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def import_dump(path, backend, state_path, batch_size=BATCH_SIZE):
+    state = ImportState.load(state_path)
+    if state is None:
+        print("No import state: reading checksums of existing puzzles")
+        state = ImportState.from_rows(backend.existing_rows())
+
+    stats = {"read": 0, "changed": 0, "invalid": 0, "written": 0}
+    seen = []
+    start = time.perf_counter()
+
+    def counted(rows, name):
+        for row in rows:
+            stats[name] += 1
+            if name == "read" and stats["read"] % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{stats['read']} rows read, {stats['changed']} changed, {stats['written']} written, "
+                      f"{stats['invalid']} invalid ({stats['read'] / elapsed:.0f} rows/s)")
+            yield row
+
+    def checked(rows):
+        for row, puzzle_hash, crc in rows:
+            valid = validate(row)
+            if valid is None:
+                stats["invalid"] += 1  # В состояние не попадает: при следующем импорте строка проверится снова
+            else:
+                yield valid, puzzle_hash, crc
+
+    with open_dump(path) as file:
+        rows = counted(read_rows(file), "read")
+        rows = counted(select_changed(rows, state, seen, batch_size), "changed")
+        for batch in batches(checked(rows), batch_size):
+            backend.write([row for row, _, _ in batch])
+            seen.append((np.array([puzzle_hash for _, puzzle_hash, _ in batch], dtype=np.uint64),
+                         np.array([crc for _, _, crc in batch], dtype=np.uint32)))
+            stats["written"] += len(batch)
+
+    # Новое состояние - суммы неизмененных и записанных строк этой выгрузки
+    if seen:
+        ImportState.build(np.concatenate([hashes for hashes, _ in seen]), np.concatenate([crcs for _, crcs in seen])).save(state_path)
+    elapsed = time.perf_counter() - start
+    print(f"Done: {stats['read']} rows read, {stats['written']} written, {stats['read'] - stats['changed']} unchanged, "
+          f"{stats['invalid']} invalid in {elapsed:.1f} s ({stats['read'] / elapsed if elapsed else 0:.0f} rows/s)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the Lichess puzzle dump")
+    parser.add_argument("dump", help="lichess_db_puzzle.csv.zst or .csv")
+    parser.add_argument("--backend", choices=("mysql", "csv"), default="mysql")
+    parser.add_argument("--output", default="puzzles.csv", help="output file for the csv backend")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--state", default="puzzles.import.npz", help="checksums of imported puzzles")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="rows per upsert")
+    args = parser.parse_args()
+
+    try:
+        backend = MySQLBackend(args.config) if args.backend == "mysql" else CSVBackend(args.output)
+    except ImportError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    try:
+        import_dump(args.dump, backend, args.state, args.batch)
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing.util import Finalize
+
+import chess
+import chess.engine
+import chess.pgn
+
+# Поиск новых задачек в партиях из PGN. Первый проход дешевый: по ходу партии ищем, где после хода одной стороны
+# другая выигрывает материал или ставит мат. Кандидатов проверяет пул процессов с двигателями (MultiPV 2):
+# у решающего должен быть единственный выигрывающий ход на каждом шаге.
+# Результат - CSV в формате таблицы puzzles (см. guide.md); прогресс сохраняется в JSON, прерванный запуск продолжается
+
+ENGINE = "./stockfish-ubuntu-x86-64-avx2"
+COLUMNS = ("PuzzleId", "FEN", "Moves", "Rating", "RatingDeviation", "Popularity", "NbPlays", "Themes", "GameUrl", "OpeningTags")
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900}
+GAMES_PER_BATCH = 200  # Между сохранениями прогресса
+MIN_SWING = 200  # Насколько должен вырасти материальный перевес решающего (сотые пешки)
+HORIZON = 4  # За сколько полуходов после ошибки
+WINNING = 200  # Оценка лучшего хода, с которой позиция считается выигранной
+NOT_WINNING = 100  # Второй по силе ход не должен давать больше
+MAX_SOLVER_MOVES = 4
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def material(board):
+    # Материальный перевес белых
+    return sum(value * (len(board.pieces(kind, chess.WHITE)) - len(board.pieces(kind, chess.BLACK)))
+               for kind, value in PIECE_VALUES.items())
+
+
+def find_candidates(game, min_ply=6):
+    # Дешевый проход по партии: (FEN до ошибки, ошибочный ход, номер полухода)
+    board = game.board()
+    fens, moves, movers, balances = [], [], [], [material(board)]
+    for move in game.mainline_moves():
+        fens.append(board.fen())
+        moves.append(move)
+        movers.append(board.turn)
+        board.push(move)
+        balances.append(material(board))
+    mated = board.turn if board.is_checkmate() else None  # Кому поставлен мат в конце партии
+
+    candidates = []
+    ply = min_ply
+    while ply < len(moves):
+        # После хода ply ходит решающий - соперник ошибившегося
+        sign = -1 if movers[ply] == chess.WHITE else 1
+        end = min(ply + 1 + HORIZON, len(balances) - 1)
+        swing = sign * (balances[end] - balances[ply + 1])
+        mate_ahead = mated == movers[ply] and len(moves) - (ply + 1) <= HORIZON
+        if swing >= MIN_SWING or mate_ahead:
+            candidates.append((fens[ply], moves[ply].uci(), ply))
+            if not mate_ahead:
+                ply += 2  # Один выигрыш материала - один кандидат; перед матом проверяем каждый ход
+        ply += 1
+    return candidates
+
+
+_engine = None
+_limit = None
+
+
+def _start_engine(path, depth):
+    # Инициализация процесса пула: свой двигатель, закрывается при завершении процесса
+    global _engine, _limit
+    _engine = chess.engine.SimpleEngine.popen_uci(path)
+    _limit = chess.engine.Limit(depth=depth)
+    Finalize(_engine, _engine.quit, exitpriority=10)
+
+
+def _is_unique(best, second):
+    # Единственный выигрывающий ход: лучший выигрывает, второй - нет
+    if best.mate() is not None:
+        return best.mate() > 0 and (second is None or not (second.mate() or 0) > 0)
+    cp = best.score()
+    return cp >= WINNING and (second is None or second.score(mate_score=100000) < NOT_WINNING)
+
+
+def confirm(candidate):
+    # Проверка кандидата двигателем; возвращает (ходы, оценка первого хода решающего) или None
+    fen, blunder, game_url = candidate
+    board = chess.Board(fen)
+    board.push_uci(blunder)
+    solver = board.turn
+    moves = [blunder]
+    first_score = None
+    for _ in range(MAX_SOLVER_MOVES):
+        infos = _engine.analyse(board, _limit, multipv=2)
+        if not infos or "pv" not in infos[0]:
+            break
+        best = infos[0]["score"].pov(solver)
+        second = infos[1]["score"].pov(solver) if len(infos) > 1 else None
+        if not _is_unique(best, second):
+            break
+        first_score = first_score or best
+        pv = infos[0]["pv"]
+        moves.append(pv[0].uci())
+        board.push(pv[0])
+        if board.is_game_over() or len(pv) < 2:
+            break
+        moves.append(pv[1].uci())  # Ответ соперника - по главному варианту
+        board.push(pv[1])
+
+    if len(moves) % 2 == 1:
+        moves.pop()  # Задачка заканчивается ходом решающего
+    if len(moves) < 2:
+        return None
+    return fen, moves, first_score, game_url
+
+
+def puzzle_row(fen, moves, score, game_url):
+    # Строка таблицы puzzles: темы и грубая оценка рейтинга по длине решения и характеру первого хода
+    solver_moves = len(moves) // 2
+    board = chess.Board(fen)
+    board.push_uci(moves[0])
+    first = chess.Move.from_uci(moves[1])
+    quiet = not board.is_capture(first) and not board.gives_check(first)
+    for move in moves[1:]:
+        board.push_uci(move)
+
+    themes = []
+    if board.is_checkmate():
+        themes += ["mate", f"mateIn{solver_moves}"]
+    else:
+        themes.append("crushing" if score.score(mate_score=100000) >= 600 else "advantage")
+    themes.append({1: "oneMove", 2: "short", 3: "long"}.get(solver_moves, "veryLong"))
+    pieces = chess.popcount(board.occupied)
+    themes.append("endgame" if pieces <= 12 else "opening" if board.fullmove_number <= 12 else "middlegame")
+
+    rating = 1000 + 250 * (solver_moves - 1) + (300 if quiet else 0) + (150 if "advantage" in themes else 0)
+    digest = int.from_bytes(hashlib.sha1(f"{fen} {' '.join(moves)}".encode()).digest()[:8], "big")
+    puzzle_id = ""
+    for _ in range(8):
+        digest, index = divmod(digest, 62)
+        puzzle_id += BASE62[index]
+    return [puzzle_id, fen, " ".join(moves), rating, 500, 0, 0, " ".join(themes), game_url, ""]
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return {"offset": 0, "games": 0, "candidates": 0, "puzzles": 0}
+
+
+def _save_checkpoint(path, checkpoint):
+    # Атомарная запись: прерывание не оставит половину файла
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(temporary, path)
+
+
+def _written_ids(path):
+    # PuzzleId уже записанных задачек: прерванная пачка при продолжении проверяется заново, ее строки не должны
+    # попасть в файл дважды. Оборванная при прерывании последняя строка отрезается
+    with open(path, "rb+") as file:
+        data = file.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            file.truncate(end)
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Заголовок
+        return {row[0] for row in reader if row}
+
+
+def _read_batch(file, size):
+    # Кандидаты из следующих size партий: (FEN, ошибочный ход, ссылка на партию)
+    candidates, games = [], 0
+    while games < size:
+        game = chess.pgn.read_game(file)
+        if game is None:
+            break
+        games += 1
+        site = game.headers.get("Site", "")
+        for fen, blunder, ply in find_candidates(game):
+            candidates.append((fen, blunder, f"{site}#{ply + 1}" if site.startswith("http") else site))
+    return candidates, games
+
+
+def mine(pgn_path, output_path, checkpoint_path, workers, depth, engine_path=ENGINE):
+    checkpoint = _load_checkpoint(checkpoint_path)
+    new_file = not os.path.exists(output_path) or checkpoint["offset"] == 0
+    start = time.perf_counter()
+    games_before = checkpoint["games"]
+    written = set() if new_file else _written_ids(output_path)
+
+    with open(pgn_path) as pgn, open(output_path, "w" if new_file else "a", newline="") as output, \
+            multiprocessing.Pool(workers, initializer=_start_engine, initargs=(engine_path, depth)) as pool:
+        writer = csv.writer(output)
+        if new_file:
+            writer.writerow(COLUMNS)
+        pgn.seek(checkpoint["offset"])
+        while True:
+            candidates, games = _read_batch(pgn, GAMES_PER_BATCH)
+            if not games:
+                break
+            for result in pool.imap_unordered(confirm, candidates, chunksize=4):
+                if result:
+                    row = puzzle_row(*result)
+                    if row[0] in written:
+                        continue
+                    written.add(row[0])
+                    writer.writerow(row)
+            output.flush()
+
+            checkpoint["offset"] = pgn.tell()
+            checkpoint["games"] += games
+            checkpoint["candidates"] += len(candidates)
+            checkpoint["puzzles"] = len(written)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            rate = (checkpoint["games"] - games_before) / (time.perf_counter() - start)
+            print(f"{checkpoint['games']} games, {checkpoint['candidates']} candidates, "
+                  f"{checkpoint['puzzles']} puzzles ({rate:.1f} games/s)")
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine puzzles from PGN games")
+    parser.add_argument("pgn", help="PGN file with games")
+    parser.add_argument("output", help="CSV file for puzzles (appended when resuming)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of engine processes")
+    parser.add_argument("--depth", type=int, default=18, help="engine search depth")
+    parser.add_argument("--engine", default=ENGINE, help="path to a UCI engine")
+    parser.add_argument("--checkpoint", help="progress file (default: <output>.checkpoint.json)")
+    args = parser.parse_args()
+
+    mine(args.pgn, args.output, args.checkpoint or args.output + ".checkpoint.json", args.workers, args.depth, args.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+import random
+
+# Компактная неизменяемая позиция: 64 байта доски (символы FEN, '.' - пустая клетка)
+# плюс состояние партии. Клетки нумеруются как Board.grid: индекс = row * 8 + col, row 0 - восьмая горизонталь.
+# Позицию можно использовать как ключ словаря и дешево передавать в другие процессы
+
+EMPTY = ord(".")
+PIECES = "PNBRQKpnbrqk"
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Ключи Zobrist (фиксированное зерно, чтобы хеши совпадали во всех процессах)
+_random = random.Random(20241019)
+ZOBRIST_PIECES = {piece: [_random.getrandbits(64) for _ in range(64)] for piece in PIECES.encode()}
+ZOBRIST_CASTLING = {right: _random.getrandbits(64) for right in "KQkq"}
+ZOBRIST_EN_PASSANT = [_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _random.getrandbits(64)
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _targets(deltas):
+    # Клетки, куда можно попасть одним шагом (конь, король)
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        table.append([(row + dy) * 8 + col + dx for dy, dx in deltas if _on_board(row + dy, col + dx)])
+    return table
+
+
+def _rays(directions):
+    # Лучи для дальнобойных фигур: для каждой клетки список клеток по каждому направлению
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        rays = []
+        for dy, dx in directions:
+            ray = []
+            y, x = row + dy, col + dx
+            while _on_board(y, x):
+                ray.append(y * 8 + x)
+                y, x = y + dy, x + dx
+            rays.append(ray)
+        table.append(rays)
+    return table
+
+
+KNIGHT_TARGETS = _targets([(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)])
+KING_TARGETS = _targets([(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)])
+ROOK_RAYS = _rays([(0, 1), (1, 0), (0, -1), (-1, 0)])
+BISHOP_RAYS = _rays([(1, 1), (1, -1), (-1, -1), (-1, 1)])
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+
+# Клетки, при ходе с которых или на которые теряется право на рокировку
+CASTLING_SQUARES = {60: "KQ", 63: "K", 56: "Q", 4: "kq", 7: "k", 0: "q"}
+
+
+def square_name(square):
+    row, col = divmod(square, 8)
+    return f"{chr(ord("a") + col)}{8 - row}"
+
+
+def parse_square(name):
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord("a")
+
+
+def _en_passant_capturable(board, end, white):
+    # Пешку, прошедшую на end через поле, можно взять на проходе: рядом с end стоит пешка соперника
+    # (то же правило, что у python-chess для поля взятия на проходе). Иначе поле не ставится и не входит в ключ
+    enemy = ord("p" if white else "P")
+    col = end % 8
+    return (col > 0 and board[end - 1] == enemy) or (col < 7 and board[end + 1] == enemy)
+
+
+def _en_passant_square(board, en_passant, turn):
+    # Поле взятия на проходе из FEN или доски игры по тому же правилу, что и в apply
+    if en_passant is None:
+        return None
+    pushed = en_passant + (-8 if turn == "black" else 8)  # Пешка, только что сделавшая двойной ход
+    return en_passant if 0 <= pushed < 64 and _en_passant_capturable(board, pushed, turn == "black") else None
+
+
+def move_to_uci(move):
+    start, end, promotion = move
+    return f"{square_name(start)}{square_name(end)}{promotion.lower()}"
+
+
+def move_from_uci(uci):
+    return parse_square(uci[:2]), parse_square(uci[2:4]), uci[4:].lower()
+
+
+class Position:
+    __slots__ = ("board", "turn", "castling", "en_passant", "halfmove_clock", "fullmove_number", "key")
+
+    def __init__(self, board, turn="white", castling="KQkq", en_passant=None, halfmove_clock=0, fullmove_number=1, key=None):
+        assign = object.__setattr__  # Позиция неизменяема: поля задаются только здесь
+        assign(self, "board", bytes(board))
+        assign(self, "turn", turn)
+        assign(self, "castling", "".join(right for right in "KQkq" if right in castling))
+        assign(self, "en_passant", en_passant)
+        assign(self, "halfmove_clock", halfmove_clock)
+        assign(self, "fullmove_number", fullmove_number)
+        assign(self, "key", self._zobrist() if key is None else key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Position is immutable")
+
+    def __reduce__(self):
+        # Сериализация для pickle: только байты доски и поля состояния
+        return (Position, (self.board, self.turn, self.castling, self.en_passant, self.halfmove_clock, self.fullmove_number, self.key))
+
+    def __hash__(self):
+        return self.key
+
+    def __eq__(self, other):
+        # Позиции равны при одинаковой расстановке, очереди хода, рокировках и взятии на проходе
+        return (isinstance(other, Position) and self.key == other.key and self.board == other.board
+                and self.turn == other.turn and self.castling == other.castling and self.en_passant == other.en_passant)
+
+    def __repr__(self):
+        return f"Position({self.fen()!r})"
+
+    def _zobrist(self):
+        key = 0
+        for square, piece in enumerate(self.board):
+            if piece != EMPTY:
+                key ^= ZOBRIST_PIECES[piece][square]
+        for right in self.castling:
+            key ^= ZOBRIST_CASTLING[right]
+        if self.en_passant is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant % 8]
+        if self.turn == "black":
+            key ^= ZOBRIST_BLACK
+        return key
+
+    @classmethod
+    def from_fen(cls, fen=STARTING_FEN):
+        parts = fen.split()
+        board = bytearray()
+        for line in parts[0].split("/"):
+            for character in line:
+                if character.isdigit():
+                    board.extend(b"." * int(character))
+                else:
+                    board.append(ord(character))
+        if len(board) != 64:
+            raise ValueError(f"Invalid FEN: {fen}")
+        turn = "black" if len(parts) > 1 and parts[1] == "b" else "white"
+        castling = parts[2] if len(parts) > 2 and parts[2] != "-" else ""
+        en_passant = parse_square(parts[3]) if len(parts) > 3 and parts[3] != "-" else None
+        en_passant = _en_passant_square(board, en_passant, turn)
+        halfmove_clock = int(parts[4]) if len(parts) > 4 else 0
+        fullmove_number = int(parts[5]) if len(parts) > 5 else 1
+        return cls(board, turn, castling, en_passant, halfmove_clock, fullmove_number)
+
+    @classmethod
+    def from_board(cls, board, turn):
+        # Позиция из доски игры (Board из game.py)
+        squares = bytes(ord(piece.character) if piece else EMPTY for row in board.grid for piece in row)
+        castling = board._get_castling_rights()
+        en_passant = board.en_passant_target[0] * 8 + board.en_passant_target[1] if board.en_passant_target else None
+        en_passant = _en_passant_square(squares, en_passant, turn)
+        return cls(squares, turn, castling if castling != "-" else "", en_passant, board.halfmove_clock, board.fullmove_number)
+
+    def fen(self):
+        lines = []
+        for row in range(8):
+            line, blank = "", 0
+            for piece in self.board[row * 8:row * 8 + 8]:
+                if piece == EMPTY:
+                    blank += 1
+                    continue
+                if blank:
+                    line += str(blank)
+                    blank = 0
+                line += chr(piece)
+            lines.append(line + (str(blank) if blank else ""))
+        en_passant = square_name(self.en_passant) if self.en_passant is not None else "-"
+        return f"{"/".join(lines)} {self.turn[0]} {self.castling or "-"} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+    def piece_at(self, square):
+        piece = self.board[square]
+        return None if piece == EMPTY else chr(piece)
+
+    def is_attacked(self, square, by_white):
+        # Атакована ли клетка фигурами указанного цвета
+        board = self.board
+        knight, king, pawn = (b"N", b"K", b"P") if by_white else (b"n", b"k", b"p")
+        rook_like, bishop_like = (b"RQ", b"BQ") if by_white else (b"rq", b"bq")
+        for target in KNIGHT_TARGETS[square]:
+            if board[target] == knight[0]:
+                return True
+        for target in KING_TARGETS[square]:
+            if board[target] == king[0]:
+                return True
+        row, col = divmod(square, 8)
+        pawn_row = row + 1 if by_white else row - 1  # Пешки бьют со стороны своего лагеря
+        if 0 <= pawn_row < 8:
+            for dx in (-1, 1):
+                if 0 <= col + dx < 8 and board[pawn_row * 8 + col + dx] == pawn[0]:
+                    return True
+        for rays, attackers in ((ROOK_RAYS[square], rook_like), (BISHOP_RAYS[square], bishop_like)):
+            for ray in rays:
+                for target in ray:
+                    piece = board[target]
+                    if piece != EMPTY:
+                        if piece in attackers:
+                            return True
+                        break
+        return False
+
+    def king_square(self, white):
+        return self.board.find(b"K" if white else b"k")
+
+    def is_check(self):
+        white = self.turn == "white"
+        king = self.king_square(white)
+        return king >= 0 and self.is_attacked(king, not white)
+
+    def pseudo_legal_moves(self):
+        # Ходы без проверки шаха своему королю: (откуда, куда, превращение)
+        board = self.board
+        white = self.turn == "white"
+        own = str.isupper if white else str.islower
+        moves = []
+        for square, piece in enumerate(board):
+            if piece == EMPTY:
+                continue
+            character = chr(piece)
+            if not own(character):
+                continue
+            kind = character.upper()
+            if kind == "P":
+                self._pawn_moves(square, white, moves)
+            elif kind == "N" or kind == "K":
+                for target in (KNIGHT_TARGETS if kind == "N" else KING_TARGETS)[square]:
+                    if board[target] == EMPTY or not own(chr(board[target])):
+                        moves.append((square, target, ""))
+                if kind == "K":
+                    self._castling_moves(square, white, moves)
+            else:
+                rays = {"B": BISHOP_RAYS, "R": ROOK_RAYS, "Q": QUEEN_RAYS}[kind][square]
+                for ray in rays:
+                    for target in ray:
+                        if board[target] == EMPTY:
+                            moves.append((square, target, ""))
+                        else:
+                            if not own(chr(board[target])):
+                                moves.append((square, target, ""))
+                            break
+        return moves
+
+    def _pawn_moves(self, square, white, moves):
+        board = self.board
+        row, col = divmod(square, 8)
+        direction = -1 if white else 1
+        start_row, last_row = (6, 0) if white else (1, 7)
+        enemy = str.islower if white else str.isupper
+
+        def add(target):
+            if target // 8 == last_row:
+                for promotion in ("q", "r", "b", "n"):
+                    moves.append((square, target, promotion))
+            else:
+                moves.append((square, target, ""))
+
+        forward = square + 8 * direction
+        if board[forward] == EMPTY:
+            add(forward)
+            double = forward + 8 * direction
+            if row == start_row and board[double] == EMPTY:
+                moves.append((square, double, ""))
+        for dx in (-1, 1):
+            if 0 <= col + dx < 8:
+                target = forward + dx
+                if board[target] != EMPTY and enemy(chr(board[target])) or target == self.en_passant:
+                    add(target)
+
+    def _castling_moves(self, square, white, moves):
+        board = self.board
+        king_side, queen_side, home = ("K", "Q", 60) if white else ("k", "q", 4)
+        if square != home or self.is_attacked(home, not white):
+            return
+        if king_side in self.castling and board[home + 1] == EMPTY and board[home + 2] == EMPTY:
+            if not self.is_attacked(home + 1, not white) and not self.is_attacked(home + 2, not white):
+                moves.append((home, home + 2, ""))
+        if queen_side in self.castling and board[home - 1] == EMPTY and board[home - 2] == EMPTY and board[home - 3] == EMPTY:
+            if not self.is_attacked(home - 1, not white) and not self.is_attacked(home - 2, not white):
+                moves.append((home, home - 2, ""))
+
+    def legal_moves(self):
+        # Легальные ходы: после хода свой король не под боем
+        white = self.turn == "white"
+        legal = []
+        for move in self.pseudo_legal_moves():
+            child = self.apply(move)
+            king = child.king_square(white)
+            if king < 0 or not child.is_attacked(king, not white):
+                legal.append(move)
+        return legal
+
+    def apply(self, move):
+        # Новая позиция после хода (UCI-строка или кортеж (откуда, куда, превращение))
+        if isinstance(move, str):
+            move = move_from_uci(move)
+        start, end, promotion = move
+        board = bytearray(self.board)
+        piece = board[start]
+        captured = board[end]
+        white = self.turn == "white"
+        kind = chr(piece).upper()
+        key = self.key
+
+        def put(square, new):
+            nonlocal key
+            old = board[square]
+            if old != EMPTY:
+                key ^= ZOBRIST_PIECES[old][square]
+            if new != EMPTY:
+                key ^= ZOBRIST_PIECES[new][square]
+            board[square] = new
+
+        put(start, EMPTY)
+        if kind == "P" and end == self.en_passant:
+            put(end + (8 if white else -8), EMPTY)  # Взятие на проходе
+            captured = ord("p" if white else "P")
+        if kind == "K" and abs(end - start) == 2:
+            rook_from, rook_to = (start + 3, start + 1) if end > start else (start - 4, start - 1)
+            put(rook_to, board[rook_from])
+            put(rook_from, EMPTY)
+        if promotion:
+            piece = ord(promotion.upper() if white else promotion.lower())
+        put(end, piece)
+
+        castling = self.castling
+        for square in (start, end):
+            for right in CASTLING_SQUARES.get(square, ""):
+                if right in castling:
+                    castling = castling.replace(right, "")
+                    key ^= ZOBRIST_CASTLING[right]
+
+        if self.en_passant is not None:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant % 8]
+        en_passant = None
+        if kind == "P" and abs(end - start) == 16 and _en_passant_capturable(board, end, white):
+            en_passant = (start + end) // 2
+            key ^= ZOBRIST_EN_PASSANT[en_passant % 8]
+
+        key ^= ZOBRIST_BLACK
+        halfmove_clock = 0 if kind == "P" or captured != EMPTY else self.halfmove_clock + 1
+        fullmove_number = self.fullmove_number + (0 if white else 1)
+        return Position(board, "black" if white else "white", castling, en_passant, halfmove_clock, fullmove_number, key)
+
+
+# Позиции для проверки генератора ходов (стандартный набор perft)
+CHECK_FENS = (
+    STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+)
+
+
+def check(depth=2):
+    # Сверка с python-chess до глубины depth: списки легальных ходов и поле взятия на проходе совпадают, а ключ, обновляемый
+    # по ходу в apply, равен ключу, посчитанному заново по всей позиции. Сами ключи - свои (с фиксированным
+    # зерном), со значениями Polyglot в python-chess они не совпадают и не должны
+    import chess
+
+    nodes = 0
+
+    def walk(position, board, depth):
+        nonlocal nodes
+        nodes += 1
+        ours = sorted(move_to_uci(move) for move in position.legal_moves())
+        theirs = sorted(move.uci() for move in board.legal_moves)
+        if ours != theirs:
+            raise AssertionError(f"Legal moves differ in {board.fen()}: {set(ours) ^ set(theirs)}")
+        fresh = Position(position.board, position.turn, position.castling, position.en_passant)
+        if position.key != fresh.key:
+            raise AssertionError(f"Incremental key differs from a full recompute in {board.fen()}")
+        if (position.en_passant is not None) != board.has_pseudo_legal_en_passant():
+            raise AssertionError(f"En passant square differs in {board.fen()}")
+        if depth > 1:
+            for move in theirs:
+                board.push_uci(move)
+                walk(position.apply(move), board, depth - 1)
+                board.pop()
+
+    for fen in CHECK_FENS:
+        walk(Position.from_fen(fen), chess.Board(fen), depth + 1)
+    return nodes
+
+
+def main():
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--check":
+        print(f"OK: {check(int(sys.argv[2]) if len(sys.argv) > 2 else 2)} positions match python-chess")
+    else:
+        print("Usage: python position.py --check [depth]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
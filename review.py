@@ -0,0 +1,157 @@
+import argparse
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.engine
+import chess.pgn
+
+from analysis_cache import AnalysisCache
+
+# Разбор сыгранных партий: каждая позиция оценивается пулом двигателей (позиции распределяются
+# между двигателями, повторяющиеся позиции и уже разобранные ранее берутся из AnalysisCache).
+# Потеря оценки ходом определяет неточность, ошибку или зевок; результат - PGN с оценками и пометками
+
+ENGINE = "./stockfish-ubuntu-x86-64-avx2"
+MAX_SCORE = 1000  # Оценки ограничиваем: +15 и +20 одинаково выиграны
+MATE_SCORE = 10000
+# (потеря в сотых пешки, название, NAG)
+CLASSIFICATIONS = (
+    (300, "blunder", chess.pgn.NAG_BLUNDER),
+    (100, "mistake", chess.pgn.NAG_MISTAKE),
+    (50, "inaccuracy", chess.pgn.NAG_DUBIOUS_MOVE),
+)
+
+
+def classify(loss):
+    # Название и NAG для потери оценки ходом (None, если ход хороший)
+    for threshold, name, nag in CLASSIFICATIONS:
+        if loss >= threshold:
+            return name, nag
+    return None
+
+
+class GameReview:
+    def __init__(self, engine_path=ENGINE, workers=4, depth=15, cache=None):
+        self.limit = chess.engine.Limit(depth=depth)
+        self.cache = cache
+        self.engines = queue.Queue()  # Свободные двигатели
+        for _ in range(workers):
+            self.engines.put(chess.engine.SimpleEngine.popen_uci(engine_path))
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers)
+
+    def evaluate(self, fen):
+        # Оценка позиции для стороны, чей ход (сотые пешки), и лучший ход в UCI
+        if self.cache:
+            entry = self.cache.get(fen, self.limit)
+            # Записи без оценки (старые analysis.db, ход после ponderhit) считаем промахом и анализируем заново
+            if entry and (entry["cp"] is not None or entry["mate"] is not None):
+                return self._score(entry["cp"], entry["mate"]), entry["move"]
+
+        board = chess.Board(fen)
+        if board.is_game_over():
+            # Мат или пат на доске: двигатель не нужен
+            return (-MATE_SCORE if board.is_checkmate() else 0), None
+
+        engine = self.engines.get()
+        try:
+            info = engine.analyse(board, self.limit)
+        finally:
+            self.engines.put(engine)
+        score = info["score"].relative
+        move = info["pv"][0] if info.get("pv") else None
+        if self.cache and move:
+            self.cache.put(fen, self.limit, move, info)
+        return self._score(score.score(), score.mate()), move.uci() if move else None
+
+    @staticmethod
+    def _score(cp, mate):
+        if mate is not None:
+            return MATE_SCORE - abs(mate) if mate > 0 else -MATE_SCORE + abs(mate)
+        return cp
+
+    def review(self, moves, start_fen=chess.STARTING_FEN, headers=None):
+        # Разбор партии: (PGN-партия с оценками и пометками, счетчики ошибок по цветам)
+        board = chess.Board(start_fen)
+        fens = [board.fen()]
+        for move in moves:
+            board.push_uci(move)
+            fens.append(board.fen())
+
+        # Каждая различная позиция оценивается один раз, позиции распределяются между двигателями
+        positions = list(dict.fromkeys(fens))
+        evaluations = dict(zip(positions, self.executor.map(self.evaluate, positions)))
+
+        game = chess.pgn.Game()
+        if start_fen != chess.STARTING_FEN:
+            game.setup(start_fen)
+        for name, value in (headers or {}).items():
+            game.headers[name] = value
+
+        summary = {"white": {}, "black": {}}
+        node = game
+        board = chess.Board(start_fen)
+        for ply, move in enumerate(moves):
+            color = "white" if board.turn == chess.WHITE else "black"
+            before, best = evaluations[fens[ply]]
+            after = -evaluations[fens[ply + 1]][0]  # Оценка после хода - с точки зрения соперника
+            loss = max(min(before, MAX_SCORE) - min(after, MAX_SCORE), 0)
+
+            played = chess.Move.from_uci(move)
+            node = node.add_variation(played)
+            white_score = after if color == "white" else -after
+            node.comment = f"[%eval {white_score / 100:.2f}]" if abs(white_score) < MATE_SCORE - 100 else ""
+            verdict = classify(loss) if best != move else None
+            if verdict:
+                name, nag = verdict
+                node.nags.add(nag)
+                node.comment += f" {name.capitalize()}. Best was {board.san(chess.Move.from_uci(best))}."
+                summary[color][name] = summary[color].get(name, 0) + 1
+            board.push(played)
+
+        game.comment = "; ".join(
+            f"{color.capitalize()}: " + (", ".join(f"{count} {name}{"s" if count > 1 else ""}" for name, count in counts.items()) or "no mistakes")
+            for color, counts in summary.items()
+        )
+        return game, summary
+
+    def review_pgn(self, file):
+        # Разбор всех партий из PGN-файла по очереди
+        while True:
+            game = chess.pgn.read_game(file)
+            if game is None:
+                return
+            moves = [move.uci() for move in game.mainline_moves()]
+            reviewed, _ = self.review(moves, game.board().fen(), dict(game.headers))
+            yield reviewed
+
+    def close(self):
+        self.executor.shutdown()
+        for _ in range(self.workers):
+            self.engines.get().quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate games with engine analysis")
+    parser.add_argument("pgn", help="PGN file with games")
+    parser.add_argument("--workers", type=int, default=4, help="number of engines")
+    parser.add_argument("--depth", type=int, default=15, help="engine search depth")
+    parser.add_argument("--engine", default=ENGINE, help="path to a UCI engine")
+    args = parser.parse_args()
+
+    cache = AnalysisCache()
+    reviewer = GameReview(args.engine, args.workers, args.depth, cache)
+    try:
+        with open(args.pgn) as file:
+            for game in reviewer.review_pgn(file):
+                print(game, end="\n\n")
+                sys.stdout.flush()
+    finally:
+        reviewer.close()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import configparser
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from evaluation import Evaluator
+from position import EMPTY, STARTING_FEN, Position, move_to_uci
+
+# Параллельный поиск альфа-бета для встроенного соперника (Lazy SMP): несколько процессов ищут
+# из одной корневой позиции и делятся таблицей транспозиций в общей памяти (multiprocessing.shared_memory).
+# Запись таблицы - два uint64: (ключ ^ данные, данные). Записи обновляются без блокировок: если два процесса
+# пишут одну запись одновременно, ключ ^ данные не сойдется с ключом позиции и запись просто не найдется
+
+MATE = 30000
+EXACT, LOWER, UPPER = 0, 1, 2  # Оценка точная / не меньше / не больше
+PROMOTIONS = ("", "q", "r", "b", "n")
+PIECE_ORDER = {ord(piece): value for pieces, value in (("Pp", 1), ("Nn", 3), ("Bb", 3), ("Rr", 5), ("Qq", 9)) for piece in pieces}
+MATE_BOUND = MATE - 1000  # Оценки дальше этой границы - мат через известное число полуходов
+CHECK_EVERY = 16  # Как часто (в узлах) проверять сигнал остановки: узел с пакетной оценкой дорогой
+
+
+class Stopped(Exception):
+    pass
+
+
+def _to_table(score, ply):
+    # Матовая оценка в таблице - расстояние до мата от этого узла, а не от корня: узел встречается на разной глубине
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def _pack(move, depth, flag, score):
+    # Данные записи: ход (6 + 6 + 3 бита), глубина (8), тип оценки (2), оценка со сдвигом (16)
+    start, end, promotion = move or (0, 0, "")
+    return start | end << 6 | PROMOTIONS.index(promotion) << 12 | depth << 15 | flag << 23 | (score + 32768) << 25
+
+
+def _unpack(data):
+    start, end = data & 63, data >> 6 & 63
+    move = (start, end, PROMOTIONS[data >> 12 & 7]) if start != end else None
+    return move, data >> 15 & 255, data >> 23 & 3, (data >> 25 & 65535) - 32768
+
+
+# Таблица транспозиций поверх массива (size, 2) uint64 в общей памяти
+class TranspositionTable:
+    def __init__(self, table):
+        self.table = table
+        self.size = len(table)
+
+    def probe(self, key):
+        index = key % self.size
+        checked, data = int(self.table[index, 0]), int(self.table[index, 1])
+        if checked ^ data != key:
+            return None
+        return _unpack(data)
+
+    def store(self, key, move, depth, flag, score):
+        index = key % self.size
+        checked, old = int(self.table[index, 0]), int(self.table[index, 1])
+        # Запись другой позиции заменяем всегда, своей - только более глубокой оценкой
+        if checked ^ old == key and (old >> 15 & 255) > depth:
+            return
+        data = _pack(move, depth, flag, score)
+        self.table[index, 0] = key ^ data
+        self.table[index, 1] = data
+
+
+# Поиск в одном процессе: альфа-бета с итеративным углублением; на глубине 1 все ответы оцениваются одним пакетом
+class Searcher:
+    def __init__(self, table, stop, evaluator=None):
+        self.table = table
+        self.stop = stop
+        self.evaluator = evaluator or Evaluator(batch_size=256)
+        self.nodes = 0
+
+    def _order(self, position, moves, tt_move):
+        # Сначала ход из таблицы, затем взятия ценных фигур, затем остальные
+        board = position.board
+        moves.sort(key=lambda move: -PIECE_ORDER.get(board[move[1]], 0) if board[move[1]] != EMPTY else 0)
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def negamax(self, position, depth, alpha, beta, ply, root_moves=None):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0 and self.stop.is_set():
+            raise Stopped
+
+        original_alpha = alpha
+        tt_move = None
+        entry = self.table.probe(position.key)
+        if entry:
+            tt_move, tt_depth, flag, score = entry
+            score = _from_table(score, ply)
+            if ply > 0 and tt_depth >= depth:
+                if flag == EXACT or flag == LOWER and score >= beta or flag == UPPER and score <= alpha:
+                    return score, tt_move
+
+        moves = root_moves[:] if root_moves is not None else position.legal_moves()
+        if not moves:
+            return (-MATE + ply if position.is_check() else 0), None
+        if ply > 0 and position.halfmove_clock >= 100:
+            return 0, None
+
+        if depth <= 1:
+            scores = -self.evaluator.evaluate_batch([position.apply(move) for move in moves])
+            best = int(scores.argmax())
+            self.table.store(position.key, moves[best], 1, EXACT, _to_table(int(scores[best]), ply))
+            return int(scores[best]), moves[best]
+
+        best_score, best_move = -MATE - 1, None
+        for move in self._order(position, moves, tt_move):
+            score = -self.negamax(position.apply(move), depth - 1, -beta, -alpha, ply + 1)[0]
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        flag = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.table.store(position.key, best_move, depth, flag, _to_table(best_score, ply))
+        return best_score, best_move
+
+
+def _worker(index, memory_name, size, tasks, results, stop):
+    # Процесс поиска: ждет корневую позицию, углубляет поиск и сообщает о каждой законченной глубине
+    memory = shared_memory.SharedMemory(name=memory_name)
+    table = searcher = None
+    try:
+        table = TranspositionTable(np.ndarray((size, 2), dtype=np.uint64, buffer=memory.buf))
+        searcher = Searcher(table, stop)
+        shuffle = random.Random(index)
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            search_id, position, max_depth, root_moves = task
+            root_moves = root_moves or position.legal_moves()
+            if index:
+                shuffle.shuffle(root_moves)  # Помощники перебирают корень в своем порядке
+            searcher.nodes = 0
+            try:
+                # Помощники с нечетным номером начинают на глубину дальше - процессы расходятся по дереву
+                for depth in range(1 + index % 2, max_depth + 1):
+                    score, move = searcher.negamax(position, depth, -MATE - 1, MATE + 1, 0, root_moves)
+                    results.put((search_id, index, depth, move, score, searcher.nodes))
+            except Stopped:
+                pass
+            results.put((search_id, index, None, None, None, searcher.nodes))
+    finally:
+        del table, searcher
+        memory.close()
+
+
+# Пул процессов поиска с общей таблицей транспозиций
+class ParallelSearch:
+    def __init__(self, workers=None, depth=4, table_size=1 << 20):
+        self.workers = workers or os.cpu_count() or 1
+        self.depth = depth
+        self.table_size = table_size
+        self.memory = shared_memory.SharedMemory(create=True, size=table_size * 2 * 8)
+        self.table = np.ndarray((table_size, 2), dtype=np.uint64, buffer=self.memory.buf)
+        self.table.fill(0)
+
+        context = multiprocessing.get_context("spawn")
+        self.stop = context.Event()
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(self.workers)]
+        self.processes = [
+            context.Process(target=_worker, args=(index, self.memory.name, table_size, self.tasks[index], self.results, self.stop), daemon=True)
+            for index in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.search_id = 0
+        self.nodes = 0  # Узлы последнего поиска во всех процессах
+
+    @classmethod
+    def from_config(cls, filename="config.ini"):
+        # Настройки из раздела [search] в config.ini: workers (по умолчанию - все ядра) и depth
+        config = configparser.ConfigParser(inline_comment_prefixes=(";", "#"))
+        config.read(filename)
+        section = config["search"] if config.has_section("search") else {}
+        try:
+            workers = int(section.get("workers", 0)) or None
+            depth = int(section.get("depth", 4))
+        except ValueError:
+            raise ValueError(f"Invalid [search] settings in {filename}: workers and depth must be integers") from None
+        return cls(workers, depth)
+
+    def search(self, position, depth=None, time_limit=None, moves=None):
+        # Лучший ход (move, score, depth): до глубины depth или пока не кончится time_limit секунд.
+        # moves - ходы в корне (по умолчанию все легальные)
+        depth = depth or self.depth
+        self.search_id += 1
+        self.stop.clear()
+        for tasks in self.tasks:
+            tasks.put((self.search_id, position, depth, moves))
+
+        deadline = time.monotonic() + time_limit if time_limit else None
+        best = (None, None, 0)
+        running = self.workers
+        self.nodes = 0
+        while running:
+            # Время ограничиваем, только когда есть хотя бы один законченный результат
+            timeout = None
+            if deadline and best[0] is not None and not self.stop.is_set():
+                timeout = max(deadline - time.monotonic(), 0)
+            try:
+                search_id, index, done, move, score, nodes = self.results.get(timeout=timeout)
+            except queue.Empty:
+                self.stop.set()  # Время вышло: берем результат самой глубокой законченной итерации
+                continue
+            if search_id != self.search_id:
+                continue
+            if done is None:
+                running -= 1
+                self.nodes += nodes
+            elif done > best[2] or done == best[2] and index == 0:
+                best = (move, score, done)
+                if done == depth:
+                    self.stop.set()  # Один процесс дошел до нужной глубины - остальных останавливаем
+        return best
+
+    def close(self):
+        self.stop.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join()
+        del self.table
+        self.memory.close()
+        self.memory.unlink()
+
+
+def benchmark(fen=STARTING_FEN, depth=4, workers=(1, 2, 4)):
+    # Время до глубины depth при разном числе процессов
+    position = Position.from_fen(fen)
+    for count in workers:
+        search = ParallelSearch(count, depth)
+        try:
+            search.search(Position.from_fen(STARTING_FEN), 1)  # Прогрев: процессы запущены, модули загружены
+            search.table.fill(0)
+            start = time.perf_counter()
+            move, score, reached = search.search(position)
+            elapsed = time.perf_counter() - start
+            print(f"{count} workers: depth {reached} in {elapsed:.2f} s, {search.nodes / elapsed:.0f} nodes/s, "
+                  f"best {move_to_uci(move)} ({score})")
+        finally:
+            search.close()
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+        counts = sorted({1, 2, os.cpu_count() or 1})
+        benchmark(depth=depth, workers=counts)
+    elif len(sys.argv) > 1:
+        search = ParallelSearch()
+        try:
+            move, score, depth = search.search(Position.from_fen(" ".join(sys.argv[1:])))
+            print(f"{move_to_uci(move) if move else '-'} {score} (depth {depth})")
+        finally:
+            search.close()
+    else:
+        print("Usage: python search.py <FEN> | --bench [depth]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
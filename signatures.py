@@ -0,0 +1,231 @@
+import argparse
+import configparser
+import sys
+import time
+
+from position import Position
+
+# Индекс задачек по материалу и структуре: FEN каждой задачки разбирается один раз (позиция после первого хода
+# соперника, как ее видит решающий), результат хранится в таблице puzzle_signatures рядом с puzzles.
+# Подборки вроде "ладейные эндшпили с пешками 1400-1800" или "разноцветные слоны" - запрос по индексу (признак, Rating)
+
+VALUES = {"Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+ORDER = "QRBNP"
+BATCH_SIZE = 5000
+SIGNATURE_COLUMNS = ("PuzzleId", "Signature", "Endgame", "OppositeBishops", "PassedPawns", "Balance", "Pieces", "Rating")
+# Класс эндшпиля по набору фигур (кроме королей и пешек) на доске
+ENDGAME_CLASSES = {
+    "": "pawn", "N": "knight", "B": "bishop", "BN": "minor", "R": "rook", "BR": "rook_minor", "NR": "rook_minor",
+    "BNR": "rook_minor", "Q": "queen", "BQ": "queen_minor", "NQ": "queen_minor", "BNQ": "queen_minor", "QR": "queen_rook",
+}
+MAX_ENDGAME_PIECES = 4  # Больше фигур (кроме королей и пешек) - еще не эндшпиль
+
+
+def _side(counts):
+    # Фигуры одной стороны в порядке сигнатуры: "KRP"
+    return "K" + "".join(kind * counts.get(kind, 0) for kind in ORDER)
+
+
+def _side_key(side):
+    # Сильнейшая сторона - первой (как в названиях таблиц Syzygy): по материалу, затем по составу
+    return sum(VALUES[kind] for kind in side[1:]), [-ORDER.index(kind) for kind in side[1:]]
+
+
+def normalize_signature(text):
+    # Приведение введенной сигнатуры к виду из индекса: "krvkrp" -> "KRPvKR"
+    sides = []
+    for side in text.upper().split("V"):
+        kinds = side.replace("K", "")
+        if len(sides) == 2 or any(kind not in ORDER for kind in kinds):
+            raise ValueError(f"Invalid material signature: {text}")
+        sides.append(_side({kind: kinds.count(kind) for kind in ORDER}))
+    if len(sides) != 2:
+        raise ValueError(f"Invalid material signature: {text}")
+    return "v".join(sorted(sides, key=_side_key, reverse=True))
+
+
+def describe(position):
+    # Признаки позиции: сигнатура, класс эндшпиля, разноцветные слоны, проходные, перевес решающего, число фигур
+    counts = {"white": {}, "black": {}}
+    bishops = {"white": [], "black": []}
+    pawns = {"white": [], "black": []}
+    for square, piece in enumerate(position.board):
+        piece = chr(piece)
+        if piece == "." or piece in "Kk":
+            continue
+        color = "white" if piece.isupper() else "black"
+        kind = piece.upper()
+        counts[color][kind] = counts[color].get(kind, 0) + 1
+        if kind == "B":
+            bishops[color].append(sum(divmod(square, 8)) % 2)
+        elif kind == "P":
+            pawns[color].append(divmod(square, 8))
+
+    sides = [_side(counts["white"]), _side(counts["black"])]
+    signature = "v".join(sorted(sides, key=_side_key, reverse=True))
+
+    pieces = sorted({kind for side in counts.values() for kind in side if kind != "P"})
+    piece_count = sum(count for side in counts.values() for kind, count in side.items() if kind != "P")
+    endgame = ENDGAME_CLASSES.get("".join(pieces), "mixed") if piece_count <= MAX_ENDGAME_PIECES else ""
+
+    opposite_bishops = (len(bishops["white"]) == 1 and len(bishops["black"]) == 1
+                        and bishops["white"][0] != bishops["black"][0])
+
+    # Проходная: перед пешкой на своей и соседних вертикалях нет пешек соперника (белые идут к строке 0)
+    passed = sum(1 for row, col in pawns["white"]
+                 if not any(abs(col - other_col) <= 1 and other_row < row for other_row, other_col in pawns["black"]))
+    passed += sum(1 for row, col in pawns["black"]
+                  if not any(abs(col - other_col) <= 1 and other_row > row for other_row, other_col in pawns["white"]))
+
+    material = {color: sum(VALUES[kind] * count for kind, count in side.items()) for color, side in counts.items()}
+    solver, opponent = position.turn, "black" if position.turn == "white" else "white"
+    return {
+        "Signature": signature,
+        "Endgame": endgame,
+        "OppositeBishops": opposite_bishops,
+        "PassedPawns": passed,
+        "Balance": material[solver] - material[opponent],
+        "Pieces": 2 + piece_count + len(pawns["white"]) + len(pawns["black"]),
+    }
+
+
+def puzzle_signature(puzzle_id, fen, moves, rating):
+    # Строка puzzle_signatures для задачки
+    features = describe(Position.from_fen(fen).apply(moves.split()[0]))
+    return (puzzle_id, *(features[column] for column in SIGNATURE_COLUMNS[1:-1]), rating)
+
+
+# Индекс в MySQL: построение по таблице puzzles и поиск по признакам и рейтингу
+class SignatureIndex:
+    def __init__(self, config_file="config.ini"):
+        self.config_file = config_file
+        self.connection = self._connect()
+
+    def _connect(self):
+        import mysql.connector
+
+        config = configparser.ConfigParser()
+        config.read(self.config_file)
+        return mysql.connector.connect(
+            host=config["mysql"]["host"],
+            user=config["mysql"]["user"],
+            password=config["mysql"]["password"],
+            database=config["mysql"]["database"]
+        )
+
+    def build(self, rebuild=False, batch_size=BATCH_SIZE):
+        # Разбор задачек, которых нет в индексе или у которых изменился рейтинг (rebuild - всех).
+        # Чтение идет потоком по отдельному соединению, запись - пачками upsert'ов
+        reader = self._connect()
+        cursor = reader.cursor()
+        query = "SELECT p.PuzzleId, p.FEN, p.Moves, p.Rating FROM puzzles p"
+        if not rebuild:
+            query += (" LEFT JOIN puzzle_signatures s ON s.PuzzleId = p.PuzzleId"
+                      " WHERE s.PuzzleId IS NULL OR s.Rating <> p.Rating")
+        cursor.execute(query)
+
+        writer = self.connection.cursor()
+        update = ", ".join(f"{column} = VALUES({column})" for column in SIGNATURE_COLUMNS[1:])
+        row_placeholders = "(" + ", ".join(["%s"] * len(SIGNATURE_COLUMNS)) + ")"
+        start = time.perf_counter()
+        indexed = invalid = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = []
+                for puzzle_id, fen, moves, rating in rows:
+                    try:
+                        batch.append(puzzle_signature(puzzle_id, fen, moves, rating))
+                    except (ValueError, IndexError, KeyError):
+                        invalid += 1  # Битый FEN или ход
+                if batch:
+                    writer.execute(
+                        f"INSERT INTO puzzle_signatures ({', '.join(SIGNATURE_COLUMNS)}) "
+                        f"VALUES {', '.join([row_placeholders] * len(batch))} ON DUPLICATE KEY UPDATE {update}",
+                        [value for row in batch for value in row]
+                    )
+                    self.connection.commit()
+                indexed += len(batch)
+                print(f"{indexed} puzzles indexed ({indexed / (time.perf_counter() - start):.0f}/s)")
+        finally:
+            writer.close()
+            cursor.close()
+            reader.close()
+        return indexed, invalid
+
+    def find(self, signature=None, endgame=None, opposite_bishops=None, min_passed=None,
+             min_rating=0, max_rating=4000, limit=100):
+        # Задачки (словари из puzzles) по признакам в диапазоне рейтинга; условия объединяются через AND
+        conditions, params = ["s.Rating BETWEEN %s AND %s"], [min_rating, max_rating]
+        if signature:
+            conditions.append("s.Signature = %s")
+            params.append(normalize_signature(signature))
+        if endgame:
+            conditions.append("s.Endgame = %s")
+            params.append(endgame)
+        if opposite_bishops is not None:
+            conditions.append("s.OppositeBishops = %s")
+            params.append(bool(opposite_bishops))
+        if min_passed:
+            conditions.append("s.PassedPawns >= %s")
+            params.append(min_passed)
+        params.append(limit)
+
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT p.* FROM puzzle_signatures s JOIN puzzles p ON p.PuzzleId = s.PuzzleId "
+            f"WHERE {' AND '.join(conditions)} ORDER BY s.Rating LIMIT %s",
+            params
+        )
+        puzzles = cursor.fetchall()
+        cursor.close()
+        return puzzles
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Material signature index over the puzzles table")
+    parser.add_argument("--config", default="config.ini")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index new and changed puzzles")
+    build.add_argument("--rebuild", action="store_true", help="reindex every puzzle")
+    find = commands.add_parser("find", help="list puzzles by material and structure")
+    find.add_argument("--signature", help="material signature, e.g. KRPvKR")
+    find.add_argument("--endgame", choices=sorted(set(ENDGAME_CLASSES.values()) | {"mixed"}))
+    find.add_argument("--opposite-bishops", action="store_true")
+    find.add_argument("--min-passed", type=int)
+    find.add_argument("--min-rating", type=int, default=0)
+    find.add_argument("--max-rating", type=int, default=4000)
+    find.add_argument("--limit", type=int, default=20)
+    describe_command = commands.add_parser("describe", help="features of a single position")
+    describe_command.add_argument("fen", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "describe":
+        print(describe(Position.from_fen(" ".join(args.fen))))
+        return
+
+    index = SignatureIndex(args.config)
+    try:
+        if args.command == "build":
+            indexed, invalid = index.build(args.rebuild)
+            print(f"Done: {indexed} puzzles indexed, {invalid} invalid")
+        else:
+            try:
+                puzzles = index.find(args.signature, args.endgame, args.opposite_bishops or None, args.min_passed,
+                                     args.min_rating, args.max_rating, args.limit)
+            except ValueError as error:
+                print(f"Error: {error}")
+                sys.exit(1)
+            for puzzle in puzzles:
+                print(puzzle["PuzzleId"], puzzle["Rating"], puzzle["FEN"], puzzle["Moves"])
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
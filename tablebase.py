@@ -0,0 +1,108 @@
+import configparser
+from collections import OrderedDict
+
+import chess
+import chess.syzygy
+
+
+# Класс для работы с эндшпильными таблицами Syzygy (WDL/DTZ)
+class Tablebase:
+    def __init__(self, path, cache_size=4096):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # Кэш результатов проб (LRU): EPD -> (wdl, dtz)
+        # python-chess открывает файлы таблиц через mmap и читает только нужные страницы
+        self.tablebase = chess.syzygy.open_tablebase(path)
+        # Максимальное число фигур, для которого есть таблицы (например, "KRvK" -> 3)
+        self.max_pieces = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+
+    @classmethod
+    def from_config(cls, filename="config.ini"):
+        # Таблицы подключаются, только если в config.ini указан путь к ним
+        config = configparser.ConfigParser()
+        config.read(filename)
+        if not config.has_option("syzygy", "path"):
+            return None
+        return cls(config["syzygy"]["path"])
+
+    def covers(self, board):
+        # Позиция есть в таблицах, если фигур мало и нет прав на рокировку
+        return not board.castling_rights and chess.popcount(board.occupied) <= self.max_pieces
+
+    def probe(self, board):
+        # Проба таблиц: (wdl, dtz) с точки зрения стороны, чей ход, или None
+        if not self.covers(board):
+            return None
+
+        key = board.epd()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        try:
+            result = (self.tablebase.probe_wdl(board), self.tablebase.probe_dtz(board))
+        except KeyError:  # Нужной таблицы нет на диске
+            result = None
+
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def best_move(self, board):
+        # Лучший ход по таблицам: мат, затем минимальный результат соперника
+        if self.probe(board) is None:
+            return None
+
+        best, best_key = None, None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    return move
+                result = self.probe(board)
+            finally:
+                board.pop()
+            if result is None:
+                return None
+            wdl, dtz = result
+            # Выигрывая, быстрее реализуем перевес; проигрывая, сопротивляемся дольше всего
+            key = (wdl, -dtz)
+            if best_key is None or key < best_key:
+                best, best_key = move, key
+        return best
+
+    def analyse(self, fen):
+        # Анализ позиции по таблицам: результат, wdl, dtz и лучший ход
+        board = chess.Board(fen)
+        result = self.probe(board)
+        if result is None:
+            return None
+        wdl, dtz = result
+        move = self.best_move(board)
+        return {
+            "result": "win" if wdl > 0 else "loss" if wdl < 0 else "draw",
+            "wdl": wdl,
+            "dtz": dtz,
+            "best_move": move.uci() if move else None,
+        }
+
+    def is_winning_move(self, fen, move):
+        # Сохраняет ли ход выигрыш (None, если позиции нет в таблицах)
+        board = chess.Board(fen)
+        result = self.probe(board)
+        move = chess.Move.from_uci(move)
+        if result is None or move not in board.legal_moves:
+            return None
+        wdl = result[0]
+        if wdl <= 0:
+            return False
+        board.push(move)
+        if board.is_checkmate():
+            return True
+        result = self.probe(board)
+        return result is not None and result[0] <= -wdl
+
+    def close(self):
+        # Закрываем файлы таблиц
+        self.tablebase.close()